@@ -0,0 +1,98 @@
+# benchmarks/bench_startup.py
+# ------------------------------------------------------------
+# Tiempo de import en frío por módulo (cada uno en un intérprete nuevo)
+# - Usa `python -X importtime` y reporta el acumulado del módulo y sus dependencias más pesadas
+# - Incluye el conjunto de imports que hace app.py al arrancar ("app.py (imports)")
+# Ejecuta: python -m benchmarks.bench_startup [--repeat 3] [--json out.json]
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Sequence, Tuple
+
+MODULES = [
+    "utils._lazy", "utils.cache", "utils.metrics", "utils.io", "utils.features",
+    "utils.inference", "utils.chat", "utils.client", "utils.simulate", "utils.server",
+    "numpy", "pandas", "sklearn.pipeline", "joblib", "streamlit", "google.generativeai",
+]
+# Lo que app.py importa al cargar, además de streamlit (sin ejecutar la UI)
+APP_IMPORTS = "utils._lazy, utils.cache, utils.chat"
+
+LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def _importtime(stmt: str) -> List[Tuple[str, float, int]] | None:
+    """[(módulo, ms acumulados, indentación)] de `python -X importtime -c stmt`."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.getcwd(), os.environ.get("PYTHONPATH", "")]))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", stmt],
+                          capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        return None
+    out = []
+    for line in proc.stderr.splitlines():
+        m = LINE.match(line)
+        if m:
+            out.append((m.group(4), int(m.group(2)) / 1000.0, len(m.group(3))))
+    return out
+
+def import_profile(stmt: str, startup: set) -> Tuple[float, List[Tuple[str, float]]] | None:
+    """
+    (ms acumulados del statement, [(dependencia directa, ms)]) o None si falla el import.
+    Se descuentan los módulos que el intérprete carga siempre (`startup`).
+    """
+    entries = _importtime(stmt)
+    if entries is None:
+        return None
+    if not entries:
+        return 0.0, []
+    top = min(e[2] for e in entries)
+    total, deps, pending = 0.0, [], []
+    # importtime lista los hijos (más indentados) antes que su padre
+    for name, ms, ind in entries:
+        if ind == top + 2:
+            pending.append((name, ms))
+        elif ind == top:
+            if name not in startup:
+                total += ms
+                deps += pending
+            pending = []
+    return total, sorted(deps, key=lambda r: -r[1])
+
+def measure(modules: Sequence[str], repeat: int) -> List[Dict]:
+    startup = {name for name, _, _ in (_importtime("pass") or [])}
+    rows = []
+    targets = [(m, f"import {m}") for m in modules]
+    targets.append(("app.py (imports)", f"import {APP_IMPORTS}"))
+    for label, stmt in targets:
+        runs = [import_profile(stmt, startup) for _ in range(repeat)]
+        if any(r is None for r in runs):
+            rows.append({"module": label, "import_ms": None, "heaviest": "no instalado"})
+            continue
+        best = min(runs, key=lambda r: r[0])
+        heavy = ", ".join(f"{n} {ms:.0f}ms" for n, ms in best[1][:3])
+        rows.append({"module": label, "import_ms": round(best[0], 1), "heaviest": heavy})
+    return rows
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark de tiempo de arranque (imports)")
+    ap.add_argument("--modules", nargs="+", default=MODULES)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--json", default=None, help="ruta para guardar los resultados en JSON")
+    args = ap.parse_args()
+
+    rows = measure(args.modules, args.repeat)
+    width = max(len(r["module"]) for r in rows)
+    print(f"{'módulo'.ljust(width)}  {'import (ms)':>11}  dependencias más pesadas")
+    for r in rows:
+        ms = f"{r['import_ms']:.1f}" if r["import_ms"] is not None else "-"
+        print(f"{r['module'].ljust(width)}  {ms:>11}  {r['heaviest']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
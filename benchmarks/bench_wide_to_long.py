@@ -0,0 +1,84 @@
+# benchmarks/bench_wide_to_long.py
+# ------------------------------------------------------------
+# Compara wide_to_long actual vs. la versión anterior (melt + apply por celda)
+# sobre tablas sintéticas tipo ICO (países × temporadas 'YYYY/YY').
+# - También mide wide_to_long(categorical=True) (country/type category desde los códigos)
+# Ejecuta: python -m benchmarks.bench_wide_to_long [--countries 10000 --seasons 60]
+#      o:  python benchmarks/bench_wide_to_long.py
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+if __package__ in (None, ""):
+    # Ejecutado como script: la raíz del repo no está en sys.path
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils.io import _end_year_from_span, wide_to_long
+
+def synthetic_wide(n_countries: int, n_seasons: int, seed: int = 42) -> pd.DataFrame:
+    """Tabla ancha con Country, Coffee type y temporadas desde 1960/61."""
+    rng = np.random.default_rng(seed)
+    types = np.array(["Arabica", "Robusta", "Arabica/Robusta", "Robusta/Arabica"])
+    data = {
+        "Country": [f"Country {i:05d}" for i in range(n_countries)],
+        "Coffee type": types[rng.integers(0, len(types), n_countries)],
+    }
+    for k in range(n_seasons):
+        y = 1960 + k
+        data[f"{y}/{(y + 1) % 100:02d}"] = rng.integers(0, 5_000_000, n_countries)
+    return pd.DataFrame(data)
+
+def wide_to_long_legacy(df: pd.DataFrame) -> pd.DataFrame:
+    """Implementación previa (solo camino ancho), para comparar."""
+    df = df.copy()
+    year_cols = [c for c in df.columns if isinstance(c, str) and "/" in c]
+    long_df = df.melt(id_vars=["Country", "Coffee type"], value_vars=year_cols,
+                      var_name="year_span", value_name="consumption")
+    long_df["year"] = long_df["year_span"].apply(_end_year_from_span).astype(int)
+    long_df = long_df.drop(columns=["year_span"])
+    long_df = long_df.rename(columns={"Country": "country", "Coffee type": "type"})
+    long_df["country"] = long_df["country"].astype(str).str.strip()
+    long_df["type"] = long_df["type"].astype(str).str.strip()
+    long_df["consumption"] = pd.to_numeric(long_df["consumption"], errors="coerce")
+    long_df = long_df.dropna(subset=["consumption"])
+    return long_df.sort_values(["country", "type", "year"]).reset_index(drop=True)
+
+def best_of(fn, arg, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark de wide_to_long")
+    ap.add_argument("--countries", type=int, default=10_000)
+    ap.add_argument("--seasons", type=int, default=60)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    wide = synthetic_wide(args.countries, args.seasons)
+    legacy = wide_to_long_legacy(wide)
+    pd.testing.assert_frame_equal(legacy, wide_to_long(wide))
+    pd.testing.assert_frame_equal(legacy, wide_to_long(wide, categorical=True).astype({"country": object, "type": object}))
+
+    t_old = best_of(wide_to_long_legacy, wide, args.repeat)
+    t_new = best_of(wide_to_long, wide, args.repeat)
+    t_cat = best_of(lambda df: wide_to_long(df, categorical=True), wide, args.repeat)
+    print(f"wide_to_long {args.countries} países × {args.seasons} temporadas "
+          f"({args.countries * args.seasons:,} celdas)")
+    print(f"  anterior : {t_old * 1000:8.1f} ms")
+    print(f"  actual   : {t_new * 1000:8.1f} ms")
+    print(f"  speedup  : {t_old / t_new:8.1f}x")
+    print(f"  category : {t_cat * 1000:8.1f} ms ({t_old / t_cat:.1f}x)")
+
+if __name__ == "__main__":
+    main()
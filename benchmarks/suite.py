@@ -0,0 +1,261 @@
+# benchmarks/suite.py
+# ------------------------------------------------------------
+# Suite de benchmarks: ingesta, merge, métricas e inferencia
+# - Datos sintéticos escalados desde data/coffee_db.csv y data/precios.csv (×10, ×100, ×1000)
+# - Tiempo (mejor de N y promedio) y pico de memoria (tracemalloc) por caso y escala
+# - Resultados en JSON; `compare` marca regresiones contra un baseline guardado
+# Ejecuta: python -m benchmarks.suite run --scales 1 10 100 --json results/bench.json
+#          python -m benchmarks.suite compare results/bench_baseline.json results/bench.json
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.inference import GroupIndex, ensure_basic_cols, predict_many, predict_with_artifact
+from utils.io import add_kpis, load_coffee_data, load_price_data, merge_coffee_price, merge_price_series
+from utils.metrics import regression_report
+
+COFFEE_PATH = "data/coffee_db.csv"
+PRICE_PATH = "data/precios.csv"
+ARTIFACT_PATH = "models/price_model.joblib"
+SCALES = (1, 10, 100)
+CASES = ("load_coffee_data", "load_price_data", "merge_coffee_price", "merge_price_series",
+         "regression_report", "predict_single", "predict_batch")
+
+# -----------------------
+# Generadores sintéticos
+# -----------------------
+
+def synthetic_coffee(base: pd.DataFrame, scale: int, seed: int = 0) -> pd.DataFrame:
+    """Tabla ancha con `scale` copias de cada país (consumo perturbado ±20%)."""
+    if scale <= 1:
+        return base.copy()
+    rng = np.random.default_rng(seed)
+    country_col, type_col = base.columns[:2]
+    year_cols = list(base.columns[2:])
+    reps = np.repeat(np.arange(len(base)), scale)
+    copy_id = np.tile(np.arange(scale), len(base))
+    out = base.iloc[reps].reset_index(drop=True)
+    out[country_col] = [c if k == 0 else f"{c} #{k}" for c, k in zip(out[country_col], copy_id)]
+    factor = rng.uniform(0.8, 1.2, size=(len(out), 1))
+    values = out[year_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    out[year_cols] = np.round(values * factor)
+    return out
+
+def synthetic_prices(base: pd.DataFrame, scale: int, seed: int = 0) -> pd.DataFrame:
+    """Precios con `scale`× filas en el mismo rango de fechas (cierre interpolado + ruido)."""
+    if scale <= 1:
+        return base.copy()
+    rng = np.random.default_rng(seed)
+    dates = pd.to_datetime(base["Price"], format="%Y-%m-%d")
+    grid = pd.date_range(dates.min(), dates.max(), periods=len(base) * scale)
+    close = np.interp(grid.asi8, dates.to_numpy().astype("int64"), base["Close"].to_numpy(dtype=float))
+    close = close * rng.normal(1.0, 0.01, len(grid))
+    return pd.DataFrame({
+        "Price": grid.strftime("%Y-%m-%d %H:%M:%S"),
+        "Close": close, "High": close * 1.01, "Low": close * 0.99, "Open": close,
+        "Volume": rng.integers(1_000, 200_000, len(grid)),
+    })
+
+# -----------------------
+# Medición
+# -----------------------
+
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Mejor y promedio de `repeat` corridas + pico de memoria en una corrida extra con tracemalloc."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"time_s": min(times), "mean_s": float(np.mean(times)), "peak_mb": peak / 2**20}
+
+def _prepare(scale: int, workdir: Path, artifact: Optional[str]) -> Dict[str, object]:
+    """Insumos de todos los casos para una escala (archivos CSV + frames en memoria)."""
+    coffee_path = workdir / f"coffee_x{scale}.csv"
+    price_path = workdir / f"precios_x{scale}.csv"
+    synthetic_coffee(pd.read_csv(COFFEE_PATH), scale).to_csv(coffee_path, index=False)
+    synthetic_prices(pd.read_csv(PRICE_PATH), scale).to_csv(price_path, index=False)
+    coffee_long = load_coffee_data(coffee_path)
+    price_yearly = load_price_data(price_path)
+    ctx = {"coffee_path": coffee_path, "price_path": price_path,
+           "coffee_long": coffee_long, "price_yearly": price_yearly}
+
+    rng = np.random.default_rng(scale)
+    y_true = rng.lognormal(4.0, 0.5, len(coffee_long))
+    ctx["y"] = (y_true, y_true * rng.normal(1.0, 0.1, len(y_true)))
+
+    if artifact and os.path.exists(artifact):
+        df = ensure_basic_cols(add_kpis(merge_coffee_price(coffee_long, price_yearly)))
+        groups = df[["country", "type"]].drop_duplicates()
+        year = int(df["year"].max())
+        ctx["clean"] = df
+        ctx["index"] = GroupIndex(df)
+        ctx["queries"] = [(c, t, year) for c, t in zip(groups["country"], groups["type"])]
+    return ctx
+
+def _case(name: str, ctx: Dict[str, object], artifact: Optional[str]) -> Optional[Callable[[], object]]:
+    """Función a medir para un caso (None si no aplica, p. ej. sin artifact)."""
+    if name == "load_coffee_data":
+        return lambda: load_coffee_data(ctx["coffee_path"])
+    if name == "load_price_data":
+        return lambda: load_price_data(ctx["price_path"])
+    if name == "merge_coffee_price":
+        return lambda: merge_coffee_price(ctx["coffee_long"], ctx["price_yearly"])
+    if name == "merge_price_series":
+        py = ctx["price_yearly"]
+        series = {"arabica": py, "robusta": py.assign(price=py["price"] * 0.6),
+                  "local": py.assign(price=py["price"] * 4000.0)}
+        type_map = {"Robusta": "robusta", "Robusta/Arabica": "robusta"}
+        return lambda: merge_price_series(ctx["coffee_long"], series, type_map)
+    if name == "regression_report":
+        return lambda: regression_report(*ctx["y"])
+    if "clean" not in ctx:
+        return None
+    df, index, queries = ctx["clean"], ctx["index"], ctx["queries"]
+    if name == "predict_single":
+        country, ctype, year = queries[len(queries) // 2]
+        return lambda: predict_with_artifact(df, artifact, year, country, ctype, index=index)
+    if name == "predict_batch":
+        return lambda: predict_many(df, artifact, queries, index=index)
+    raise ValueError(f"Caso desconocido: {name}")
+
+def _n_rows(name: str, ctx: Dict[str, object]) -> int:
+    if name == "load_price_data":
+        return int(sum(1 for _ in open(ctx["price_path"], "rb")) - 1)
+    if name == "predict_single":
+        return 1
+    if name == "predict_batch":
+        return len(ctx["queries"])
+    return len(ctx["coffee_long"])
+
+def _environment() -> Dict[str, object]:
+    import sklearn
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__, "pandas": pd.__version__, "sklearn": sklearn.__version__,
+    }
+
+def run_suite(scales: Sequence[int] = SCALES, cases: Sequence[str] = CASES, repeat: int = 3,
+              artifact: Optional[str] = ARTIFACT_PATH, verbose: bool = True) -> Dict[str, object]:
+    """Corre todos los casos en todas las escalas y devuelve {'env', 'results'}."""
+    results: List[Dict[str, object]] = []
+    with tempfile.TemporaryDirectory(prefix="coffee_bench_") as tmp:
+        for scale in scales:
+            ctx = _prepare(int(scale), Path(tmp), artifact)
+            for name in cases:
+                fn = _case(name, ctx, artifact)
+                if fn is None:
+                    if verbose:
+                        print(f"  x{scale:<5} {name:<20} (omitido: falta el artifact {artifact})")
+                    continue
+                fn()  # calentamiento (caché de artifacts/esquemas, imports)
+                row = {"case": name, "scale": int(scale), "rows": _n_rows(name, ctx), **measure(fn, repeat)}
+                results.append(row)
+                if verbose:
+                    print(f"  x{scale:<5} {name:<20} {row['time_s'] * 1000:10.1f} ms "
+                          f"{row['peak_mb']:9.1f} MB  ({row['rows']:,} filas)")
+    return {"env": _environment(), "results": results}
+
+# -----------------------
+# Comparación contra baseline
+# -----------------------
+
+def compare(baseline: Dict[str, object], current: Dict[str, object],
+            threshold: float = 0.25, mem_threshold: float = 0.5) -> pd.DataFrame:
+    """
+    Una fila por (case, scale) con ratios actual/baseline.
+    status = 'regresión' si el tiempo sube más de `threshold` o la memoria más de `mem_threshold`.
+    """
+    key = ["case", "scale"]
+    base = pd.DataFrame(baseline["results"]).set_index(key)
+    cur = pd.DataFrame(current["results"]).set_index(key)
+    out = cur[["time_s", "peak_mb"]].join(base[["time_s", "peak_mb"]], rsuffix="_base", how="outer")
+    out["time_ratio"] = out["time_s"] / out["time_s_base"]
+    out["mem_ratio"] = out["peak_mb"] / out["peak_mb_base"]
+    slower = (out["time_ratio"] > 1 + threshold) | (out["mem_ratio"] > 1 + mem_threshold)
+    faster = out["time_ratio"] < 1 - threshold
+    out["status"] = np.select([out["time_s"].isna(), out["time_s_base"].isna(), slower, faster],
+                              ["sin medir", "nuevo", "regresión", "mejora"], "ok")
+    return out.reset_index()
+
+def _load_json(path: str) -> Dict[str, object]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _print_comparison(table: pd.DataFrame) -> None:
+    print(f"{'caso':<20} {'escala':>6} {'base (ms)':>10} {'actual (ms)':>11} {'×t':>6} {'×mem':>6}  estado")
+    for r in table.itertuples(index=False):
+        fmt = lambda v, k=1000.0: "-" if pd.isna(v) else f"{v * k:.1f}"
+        print(f"{r.case:<20} {r.scale:>6} {fmt(r.time_s_base):>10} {fmt(r.time_s):>11} "
+              f"{fmt(r.time_ratio, 1.0):>6} {fmt(r.mem_ratio, 1.0):>6}  {r.status}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Suite de benchmarks (ingesta, merge, métricas, inferencia)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    run_p = sub.add_parser("run", help="corre la suite y guarda JSON")
+    run_p.add_argument("--scales", type=int, nargs="+", default=list(SCALES))
+    run_p.add_argument("--cases", nargs="+", default=list(CASES), choices=CASES)
+    run_p.add_argument("--repeat", type=int, default=3)
+    run_p.add_argument("--artifact", default=os.getenv("ART_PRICE", ARTIFACT_PATH))
+    run_p.add_argument("--json", default="results/bench.json", help="ruta del JSON de resultados")
+    run_p.add_argument("--baseline", default=None, help="JSON previo para comparar al terminar")
+    run_p.add_argument("--threshold", type=float, default=0.25)
+
+    cmp_p = sub.add_parser("compare", help="compara dos JSON (baseline vs actual)")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("current")
+    cmp_p.add_argument("--threshold", type=float, default=0.25, help="tolerancia de tiempo (0.25 = +25%%)")
+    cmp_p.add_argument("--mem-threshold", type=float, default=0.5, help="tolerancia de memoria")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "run":
+        report = run_suite(args.scales, args.cases, args.repeat, args.artifact)
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Resultados: {args.json}")
+        if not args.baseline:
+            return 0
+        baseline, current, threshold, mem_threshold = _load_json(args.baseline), report, args.threshold, 0.5
+    else:
+        baseline, current = _load_json(args.baseline), _load_json(args.current)
+        threshold, mem_threshold = args.threshold, args.mem_threshold
+
+    table = compare(baseline, current, threshold, mem_threshold)
+    _print_comparison(table)
+    # Código de salida 1 si hay regresiones (útil en CI antes de un rollout)
+    return int((table["status"] == "regresión").any())
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+# tests/test_chat.py
+# ------------------------------------------------------------
+# ChatClient con StubBackend (sin red): ventana de historial, streaming y claves de caché
+# Ejecuta: python -m pytest -q tests/test_chat.py
+# ------------------------------------------------------------
+
+from utils.chat import ChatClient, StubBackend, window
+
+GREETING = {"role": "assistant", "content": "Hola, soy CoffeeBot"}
+
+def make_client(max_messages: int = 4, cache_size: int = 8):
+    backend = StubBackend(model_name="stub-test")
+    return ChatClient(backend, max_messages=max_messages, cache_size=cache_size), backend
+
+def turns(*pairs):
+    out = [GREETING]
+    for q, a in pairs:
+        out += [{"role": "user", "content": q}, {"role": "assistant", "content": a}]
+    return out
+
+def test_window_keeps_system_and_last_messages():
+    system = {"role": "system", "content": "reglas"}
+    history = [system] + [{"role": "user", "content": str(i)} for i in range(10)] + [{"role": "tool", "content": "x"}]
+    out = window(history, 3)
+    assert out[0] == system
+    assert [m["content"] for m in out[1:]] == ["7", "8", "9"]
+    assert window(history, 0) == [system]
+
+def test_stream_sends_window_without_duplicating_prompt():
+    client, backend = make_client(max_messages=2)
+    history = turns(("a", "1"), ("b", "2")) + [{"role": "user", "content": "¿precio?"}]
+    pieces = list(client.stream(history, "¿precio?"))
+    assert len(pieces) > 1  # llega por fragmentos
+    assert "".join(pieces) == "[stub-test] (2 mensajes de contexto) ¿precio?"
+    assert [m["content"] for m in backend.last_history] == ["b", "2"]
+
+def test_cache_hits_only_with_same_context():
+    client, backend = make_client()
+    first = client.send([GREETING], "Explícalo  mejor")
+    # Otra sesión con el mismo primer turno: mismo contexto → respuesta cacheada
+    assert client.send([GREETING], "explícalo mejor") == first
+    assert backend.calls == 1 and client.stats()["hits"] == 1
+
+    # Misma pregunta de seguimiento en conversaciones distintas: no comparten respuesta
+    client.send(turns(("precio Colombia 2021", "120")), "explícalo mejor")
+    client.send(turns(("precio Brasil 2021", "95")), "explícalo mejor")
+    assert backend.calls == 3
+    assert client.stats()["misses"] == 3
+
+def test_cache_disabled_and_lru_eviction():
+    client, backend = make_client(cache_size=0)
+    client.send([], "hola")
+    client.send([], "hola")
+    assert backend.calls == 2 and client.stats()["size"] == 0
+
+    client, backend = make_client(cache_size=1)
+    client.send([], "uno")
+    client.send([], "dos")
+    client.send([], "uno")
+    assert backend.calls == 3
@@ -0,0 +1,56 @@
+# tests/test_features.py
+# ------------------------------------------------------------
+# utils.features.build_xy (vectorizado) contra groupby().shift/rolling de pandas
+# y build_xy_increment contra recalcular todo
+# Ejecuta: python -m pytest -q tests/test_features.py
+# ------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+from utils.features import GROUP_COLS, LAGS, WINDOWS, build_xy, build_xy_increment, make_codebook
+
+def _load(shuffle_seed=None):
+    df = pd.read_csv("data/coffee_clean.csv")
+    df.loc[df.sample(frac=0.05, random_state=1).index, "price"] = np.nan  # huecos
+    if shuffle_seed is not None:
+        df = df.sample(frac=1.0, random_state=shuffle_seed)
+    return df
+
+def _pandas_reference(df: pd.DataFrame, col: str) -> pd.DataFrame:
+    """Implementación con groupby (la que reemplaza build_xy), en el orden de df."""
+    s = df.sort_values([*GROUP_COLS, "year"])
+    g = s.groupby(GROUP_COLS, sort=False)[col]
+    out = pd.DataFrame(index=s.index)
+    for L in LAGS:
+        out[f"{col}_lag{L}"] = g.shift(L)
+    past = g.shift(1)
+    for w in WINDOWS:
+        out[f"{col}_ma{w}"] = past.groupby([s[c] for c in GROUP_COLS], sort=False).transform(
+            lambda x: x.rolling(w, min_periods=1).mean())
+    return out.loc[df.index]
+
+def test_build_xy_matches_groupby_reference():
+    for seed in (None, 3):
+        df = _load(seed)
+        X, y, feat_cols = build_xy(df, "price")
+        ref = _pandas_reference(df, "price")
+        pd.testing.assert_frame_equal(X[ref.columns], ref, check_exact=False, rtol=1e-12)
+        assert list(X.index) == list(df.index)
+        pd.testing.assert_series_equal(y, df["price"])
+
+def test_build_xy_increment_matches_full_rebuild():
+    df = _load()
+    codebook = make_codebook(df)
+    hist, new = df[df["year"] < 2020], df[df["year"] == 2020]
+    inc = build_xy_increment(hist, new, "consumption", codebook=codebook)
+    full = build_xy(df, "consumption", codebook=codebook)[0].loc[new.index]
+    pd.testing.assert_frame_equal(inc, full, check_exact=False, rtol=1e-12)
+
+def test_build_xy_empty_frame():
+    df = _load()
+    empty = df[df["country"] == "Atlantis"]
+    X, y, feat_cols = build_xy(empty, "price", codebook=make_codebook(df))
+    assert X.shape == (0, len(feat_cols)) and len(y) == 0
+    inc = build_xy_increment(df, empty, "price", codebook=make_codebook(df))
+    assert inc.shape == (0, len(feat_cols))
@@ -0,0 +1,84 @@
+# tests/test_io.py
+# ------------------------------------------------------------
+# Regresiones de utils.io contra las implementaciones que reemplazan:
+# - load_price_data por bloques == lectura completa == promedio de pandas
+# - IncrementalPriceMerge == merge_coffee_price sobre el histórico completo
+# - wide_to_long vectorizado == melt + apply por celda
+# Ejecuta: python -m pytest -q tests/test_io.py
+# ------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.io import (IncrementalPriceMerge, YearlyPriceAccumulator, _end_year_from_span, _read_prices,
+                      load_coffee_data, load_price_data, merge_coffee_price, wide_to_long)
+
+PRICES = "data/precios.csv"
+COFFEE = "data/coffee_db.csv"
+
+@pytest.mark.parametrize("chunksize", [1, 7, 100, 10_000])
+def test_chunked_price_load_matches_full(chunksize):
+    full = load_price_data(PRICES)
+    chunked = load_price_data(PRICES, chunksize=chunksize)
+    pd.testing.assert_frame_equal(full, chunked, check_exact=True)
+
+def test_full_price_load_matches_pandas_mean():
+    daily = _read_prices(PRICES)
+    ref = daily.groupby(daily["date"].dt.year)["close"].mean()
+    full = load_price_data(PRICES)
+    np.testing.assert_array_equal(full["year"].to_numpy(), ref.index.to_numpy())
+    np.testing.assert_allclose(full["price"].to_numpy(), ref.to_numpy(), rtol=0, atol=1e-12)
+
+def _incremental(split_years):
+    """Arranca con los años fuera de `split_years` y los agrega año por año."""
+    daily = _read_prices(PRICES)
+    years = daily["date"].dt.year
+    acc = YearlyPriceAccumulator()
+    acc.add(daily[~years.isin(split_years)])
+    inc = IncrementalPriceMerge(load_coffee_data(COFFEE), acc)
+    for y in split_years:
+        inc.update(daily[years == y])
+    return inc.merged
+
+@pytest.mark.parametrize("split_years", [range(2010, 2021), range(2005, 2009), [2000]])
+def test_incremental_merge_matches_rebuild(split_years):
+    full = merge_coffee_price(load_coffee_data(COFFEE), load_price_data(PRICES))
+    pd.testing.assert_frame_equal(_incremental(list(split_years)), full, check_exact=True)
+
+def test_single_and_multi_series_merge_agree():
+    coffee, prices = load_coffee_data(COFFEE), load_price_data(PRICES)
+    single = merge_coffee_price(coffee, prices)
+    multi = merge_coffee_price(coffee, {"kc": prices})
+    np.testing.assert_array_equal(single["price"].to_numpy(), multi["price"].to_numpy())
+
+def _melt_reference(df: pd.DataFrame) -> pd.DataFrame:
+    """wide_to_long anterior: melt + _end_year_from_span celda por celda + sort."""
+    year_cols = [c for c in df.columns if isinstance(c, str) and "/" in c]
+    out = df.melt(id_vars=["Country", "Coffee type"], value_vars=year_cols,
+                  var_name="year_span", value_name="consumption")
+    out["year"] = out["year_span"].apply(_end_year_from_span).astype(int)
+    out = out.drop(columns=["year_span"]).rename(columns={"Country": "country", "Coffee type": "type"})
+    out["country"] = out["country"].astype(str).str.strip()
+    out["type"] = out["type"].astype(str).str.strip()
+    out["consumption"] = pd.to_numeric(out["consumption"], errors="coerce")
+    out = out.dropna(subset=["consumption"])
+    return out.sort_values(["country", "type", "year"]).reset_index(drop=True)
+
+def test_wide_to_long_matches_melt_on_repo_data():
+    raw = pd.read_csv(COFFEE)
+    ref = _melt_reference(raw[["Country", "Coffee type"] + [c for c in raw.columns if "/" in c]])
+    pd.testing.assert_frame_equal(wide_to_long(raw).reset_index(drop=True), ref)
+
+def test_wide_to_long_duplicates_nans_and_categorical():
+    wide = pd.DataFrame({
+        "Country": [" Peru", "Brazil", "Peru ", "Angola"],
+        "Coffee type": ["Arabica", "Robusta", "Arabica", "Robusta"],
+        "1999/00": [1.0, np.nan, 3.0, 4.0],
+        "1998/99": [5.0, 6.0, np.nan, 8.0],
+    })
+    ref = _melt_reference(wide)
+    pd.testing.assert_frame_equal(wide_to_long(wide), ref)
+    cat = wide_to_long(wide, categorical=True)
+    assert isinstance(cat["country"].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(cat.astype({"country": object, "type": object}), ref)
@@ -0,0 +1,59 @@
+# tests/test_metrics.py
+# ------------------------------------------------------------
+# utils.metrics: regression_report_batch fila por fila == funciones escalares
+# sobre las posiciones válidas, con ceros (0 vs 0, y_true == 0) y relleno NaN
+# Ejecuta: python -m pytest -q tests/test_metrics.py
+# ------------------------------------------------------------
+
+import numpy as np
+import pytest
+
+from utils.metrics import cagr, mae, mape, mase, mase_scale, mdape, r2, regression_report_batch, rmse, smape
+
+def _padded_rows(seed=0, k=6, width=12):
+    rng = np.random.default_rng(seed)
+    y_true = rng.gamma(2.0, 50.0, (k, width))
+    y_pred = y_true * rng.normal(1.0, 0.2, (k, width))
+    y_true[:, :3] = 0.0
+    y_pred[:, :2] = 0.0            # 0 vs 0
+    y_pred[0, 2] = 0.0             # y_true == 0 en la posición 2 de todas las filas
+    y_true[1, 5:] = np.nan         # folds más cortos (relleno)
+    y_true[2, 9:] = np.nan
+    y_true[3, 3:] = np.nan         # solo ceros válidos
+    return y_true, y_pred
+
+def test_batch_matches_scalar_metrics_with_zeros_and_nans():
+    y_true, y_pred = _padded_rows()
+    y_train = np.random.default_rng(1).gamma(2.0, 50.0, (len(y_true), 20))
+    out = regression_report_batch(y_true, y_pred, y_train=y_train)
+    for i in range(len(y_true)):
+        v = ~np.isnan(y_true[i])
+        yt, yp = y_true[i, v], y_pred[i, v]
+        expected = {"MAE": mae(yt, yp), "RMSE": rmse(yt, yp), "MAPE(%)": mape(yt, yp),
+                    "sMAPE(%)": smape(yt, yp), "MdAPE(%)": mdape(yt, yp),
+                    "MASE": mase(yt, yp, y_train[i]), "R2": r2(yt, yp)}
+        for col, val in expected.items():
+            np.testing.assert_allclose(out.loc[i, col], val, rtol=1e-12, equal_nan=True, err_msg=f"fila {i}: {col}")
+        assert out.loc[i, "n"] == v.sum()
+
+def test_smape_counts_zero_vs_zero_as_perfect():
+    assert smape([0.0, 0.0, 10.0], [0.0, 0.0, 10.0]) == 0.0
+    assert smape([0.0, 10.0], [0.0, 0.0]) == pytest.approx(100.0)
+    out = regression_report_batch(np.array([[0.0, 10.0, np.nan]]), np.array([[0.0, 0.0, 5.0]]))
+    assert out.loc[0, "sMAPE(%)"] == pytest.approx(100.0)
+
+def test_mape_ignores_zero_targets():
+    assert mape([0.0, 10.0], [5.0, 12.0]) == pytest.approx(20.0)
+    assert np.isnan(mape([0.0], [1.0]))
+
+def test_mase_scale_matches_scalar_denominator():
+    y_train = np.array([[1.0, 3.0, 2.0, np.nan], [5.0, 5.0, 5.0, 5.0]])
+    np.testing.assert_allclose(mase_scale(y_train), [1.5, 1e-9])
+
+def test_cagr_nan_for_non_finite_or_non_positive_periods():
+    assert cagr(100.0, 121.0, 2) == pytest.approx(0.1)
+    out = cagr(100.0, 121.0, np.array([2.0, np.nan, np.inf, -np.inf, 0.0, -1.0, 0.5, 2.9]))
+    np.testing.assert_allclose(out[0], 0.1)
+    assert np.isnan(out[1:7]).all()
+    np.testing.assert_allclose(out[7], 0.1)  # se trunca a 2 periodos
+    assert np.isnan(cagr(100.0, 121.0, np.nan))
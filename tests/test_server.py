@@ -0,0 +1,74 @@
+# tests/test_server.py
+# ------------------------------------------------------------
+# utils.server: 400 solo para payloads inválidos (validación explícita),
+# 500 para errores dentro de la predicción
+# Ejecuta: python -m pytest -q tests/test_server.py
+# ------------------------------------------------------------
+
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import utils.server as server_mod
+from utils.server import PredictionService, make_server
+
+@pytest.fixture
+def url(tmp_path):
+    art = tmp_path / "price_model.joblib"
+    art.write_bytes(b"")  # solo tiene que existir: la predicción se reemplaza en cada test
+    service = PredictionService("data/coffee_clean.csv", {"price": str(art)}, use_cube=False)
+    srv = make_server(service, port=0)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+def _post(url, path, payload):
+    req = urllib.request.Request(url + path, data=json.dumps(payload).encode("utf-8"), method="POST",
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req) as r:
+            return r.status, json.loads(r.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+OK = {"target": "precio", "country": "Brazil", "type": "Arabica", "year": 2021}
+
+@pytest.mark.parametrize("path,payload", [
+    ("/predict", {k: v for k, v in OK.items() if k != "year"}),
+    ("/predict", {**OK, "year": "dos mil"}),
+    ("/predict", {**OK, "year": 2021.5}),
+    ("/predict", {**OK, "country": ""}),
+    ("/predict", {**OK, "target": "azucar"}),
+    ("/predict", [OK]),
+    ("/predict/batch", {"target": "price", "queries": {"country": "Brazil"}}),
+    ("/predict/batch", {"target": "price", "queries": [{"country": "Brazil", "type": "Arabica"}]}),
+])
+def test_invalid_payload_is_400(url, monkeypatch, path, payload):
+    called = []
+    monkeypatch.setattr(server_mod, "predict_with_artifact", lambda *a, **k: called.append(a))
+    monkeypatch.setattr(server_mod, "predict_many", lambda *a, **k: called.append(a))
+    status, body = _post(url, path, payload)
+    assert status == 400 and "error" in body
+    assert not called
+
+def test_prediction_errors_are_500(url, monkeypatch):
+    def boom(*args, **kwargs):
+        raise ValueError("features con forma inesperada")
+    monkeypatch.setattr(server_mod, "predict_with_artifact", boom)
+    monkeypatch.setattr(server_mod, "predict_many", boom)
+    assert _post(url, "/predict", OK)[0] == 500
+    batch = {"target": "price", "queries": [{"country": "Brazil", "type": "Arabica", "year": "2021"}]}
+    assert _post(url, "/predict/batch", batch)[0] == 500
+
+def test_valid_payload_reaches_prediction(url, monkeypatch):
+    seen = {}
+    def fake(df, art, year, country, ctype, index=None):
+        seen.update(year=year, country=country, type=ctype)
+        return {"pred": 1.0}
+    monkeypatch.setattr(server_mod, "predict_with_artifact", fake)
+    assert _post(url, "/predict", {**OK, "year": "2021"}) == (200, {"pred": 1.0})
+    assert seen == {"year": 2021, "country": "Brazil", "type": "Arabica"}
@@ -0,0 +1,62 @@
+# tests/test_simulate.py
+# ------------------------------------------------------------
+# utils.simulate: el resultado no depende del tamaño de bloque ni del orden de los grupos
+# (un stream aleatorio por grupo) y el ruido escala con la predicción de cada grupo
+# Ejecuta: python -m pytest -q tests/test_simulate.py
+# ------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import dump
+from sklearn.linear_model import Ridge
+
+from utils.features import DummyEncoder
+from utils.simulate import simulate
+
+@pytest.fixture(scope="module")
+def setup(tmp_path_factory):
+    df = pd.read_csv("data/coffee_clean.csv")
+    tmp = tmp_path_factory.mktemp("sim")
+    enc = DummyEncoder.fit(df, num_cols=["year"])
+    X = enc.transform(df)
+    paths = {}
+    rng = np.random.default_rng(0)
+    for target in ("price", "consumption"):
+        y = df[target].to_numpy(dtype=float)
+        model = Ridge(alpha=1.0).fit(X, y)
+        pred = model.predict(X)
+        art = {"model": model, "y_col": target, "feat_cols": enc.feat_cols, "encoder": enc,
+               "group_cols": ["country", "type"], "PI80_abs": 1.0, "PI95_abs": 2.0,
+               "resid_val": y[:50] - pred[:50],
+               "resid_val_log": rng.normal(0.0, 0.05, 40)}
+        paths[target] = str(tmp / f"{target}_model.joblib")
+        dump(art, paths[target])
+    groups = list(df[["country", "type"]].drop_duplicates().head(6).itertuples(index=False, name=None))
+    return df, paths, groups
+
+def _run(setup, **kw):
+    df, paths, groups = setup
+    kw.setdefault("groups", groups)
+    return simulate(df, paths["price"], paths["consumption"], range(2021, 2024), n_paths=200, seed=7, **kw)
+
+def test_chunk_size_does_not_change_result(setup):
+    base = _run(setup, chunk_size=1, keep_paths=True)
+    for chunk in (2, 4, 100):
+        other = _run(setup, chunk_size=chunk, keep_paths=True)
+        pd.testing.assert_frame_equal(base.summary, other.summary, check_exact=True)
+        for k in base.paths:
+            np.testing.assert_array_equal(base.paths[k], other.paths[k])
+
+def test_group_stream_is_independent_of_other_groups(setup):
+    _, _, groups = setup
+    full = _run(setup).summary
+    # Mismo seed y mismos índices de grupo: el grupo 0 no depende de cuántos grupos hay
+    first = _run(setup, groups=groups[:1]).summary
+    pd.testing.assert_frame_equal(full.iloc[:3].reset_index(drop=True), first, check_exact=True)
+
+def test_noise_scales_with_group_forecast(setup):
+    res = _run(setup, persistence=0.5).summary
+    width = (res["consumption_p95"] - res["consumption_p05"]) / res["pred_consumption"].clip(lower=1)
+    assert (res["consumption_p05"] > 0).all()
+    assert width.max() < 0.5
@@ -0,0 +1,33 @@
+# tests/test_train.py
+# ------------------------------------------------------------
+# utils.train: los modelos lineales (one-hot + rezagos en log1p) quedan en el rango
+# del naive en un fold de consumo (antes MASE ~ 1e4 con códigos ordinales y rezagos crudos)
+# Ejecuta: python -m pytest -q tests/test_train.py
+# ------------------------------------------------------------
+
+import numpy as np
+import pytest
+
+from utils.train import fit_rows, load_training_frame, make_model, prepare_target
+
+@pytest.fixture(scope="module")
+def consumption():
+    df, codebook = load_training_frame("data/coffee_clean.csv")
+    X, y, feat_cols, rows = prepare_target(df, "consumption", codebook)
+    return X, y, feat_cols, df["year"].to_numpy()[rows]
+
+@pytest.mark.parametrize("name", ["ridge", "lasso"])
+def test_linear_models_close_to_naive(consumption, name):
+    X, y, feat_cols, years = consumption
+    tr, va = np.flatnonzero(years < 2015), np.flatnonzero(years == 2015)
+    tr = tr[fit_rows(name, "consumption", X[tr], feat_cols)]
+    mdl = make_model(name, "consumption", feat_cols=feat_cols).fit(X[tr], y[tr])
+    lag1 = X[va, feat_cols.index("consumption_lag1")]
+    mae, naive = np.mean(np.abs(mdl.predict(X[va]) - y[va])), np.mean(np.abs(lag1 - y[va]))
+    assert mae < 5 * naive  # la versión rota quedaba ~1e4 veces peor
+
+def test_fit_rows_only_filters_linear_models(consumption):
+    X, _, feat_cols, years = consumption
+    first = years == years.min()
+    assert fit_rows("rf", "consumption", X, feat_cols).all()
+    np.testing.assert_array_equal(fit_rows("ridge", "consumption", X, feat_cols), ~first)
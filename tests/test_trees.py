@@ -0,0 +1,68 @@
+# tests/test_trees.py
+# ------------------------------------------------------------
+# utils.trees: el artifact plano que escribe `python -m utils.trees` se carga en un
+# intérprete nuevo (serializa utils.trees.FlatForest, no __main__.FlatForest)
+# y predice lo mismo que sklearn
+# Ejecuta: python -m pytest -q tests/test_trees.py
+# ------------------------------------------------------------
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from joblib import dump
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+
+ROOT = Path(__file__).resolve().parents[1]
+
+def _python(code_or_args, cwd):
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    args = ["-c", code_or_args] if isinstance(code_or_args, str) else code_or_args
+    res = subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True)
+    assert res.returncode == 0, res.stderr
+    return res.stdout
+
+@pytest.fixture
+def artifact(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 4))
+    X[rng.random(X.shape) < 0.05] = np.nan
+    y = np.nan_to_num(X[:, 0]) * 3 + rng.normal(size=200)
+    model = Pipeline([("impute", SimpleImputer(strategy="median")),
+                      ("model", RandomForestRegressor(n_estimators=5, random_state=0))]).fit(X, y)
+    path = tmp_path / "models" / "price_model.joblib"
+    path.parent.mkdir()
+    dump({"model": model, "y_col": "price", "feat_cols": ["a", "b", "c", "d"]}, path)
+    np.save(tmp_path / "X.npy", X)
+    np.save(tmp_path / "ref.npy", model.predict(X))
+    return path
+
+LOAD = """
+import numpy as np, joblib
+art = joblib.load({path!r})
+assert type(art["model"]).__module__ == "utils.trees", type(art["model"])
+np.testing.assert_allclose(art["model"].predict(np.load({X!r})), np.load({ref!r}), rtol=1e-12)
+print("ok")
+"""
+
+def test_cli_export_loads_in_fresh_interpreter(artifact):
+    tmp = artifact.parent.parent
+    _python(["-m", "utils.trees", str(artifact)], cwd=ROOT)
+    flat = artifact.parent / "price_model.flat.joblib"
+    code = LOAD.format(path=str(flat), X=str(tmp / "X.npy"), ref=str(tmp / "ref.npy"))
+    assert _python(code, cwd=ROOT).strip() == "ok"
+
+def test_relative_export_loads_from_another_cwd(artifact):
+    tmp = artifact.parent.parent
+    # Exporta con una ruta relativa y carga desde otro directorio de trabajo
+    _python(["-m", "utils.trees", "models/price_model.joblib"], cwd=tmp)
+    other = tmp / "otro"
+    other.mkdir()
+    code = LOAD.format(path=str(artifact.parent / "price_model.flat.joblib"),
+                       X=str(tmp / "X.npy"), ref=str(tmp / "ref.npy"))
+    assert _python(code, cwd=other).strip() == "ok"
@@ -0,0 +1,45 @@
+# utils/_lazy.py
+# ------------------------------------------------------------
+# Imports diferidos: el módulo real se importa en el primer acceso a un atributo
+# (pandas, sklearn, google.generativeai, ... solo se pagan si se usan)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import importlib
+import sys
+import threading
+from types import ModuleType
+
+class LazyModule(ModuleType):
+    """Proxy de un módulo; tras el primer acceso copia sus atributos (lookups sin overhead)."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_lock"] = threading.Lock()
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> ModuleType:
+        mod = self.__dict__["_lazy_module"]
+        if mod is None:
+            with self.__dict__["_lazy_lock"]:
+                mod = self.__dict__["_lazy_module"]
+                if mod is None:
+                    mod = importlib.import_module(self.__name__)
+                    self.__dict__.update({k: v for k, v in mod.__dict__.items() if not k.startswith("__")})
+                    self.__dict__["_lazy_module"] = mod
+        return mod
+
+    def __getattr__(self, attr: str):
+        # Solo se llama si el atributo aún no está en el proxy
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "cargado" if self.__dict__["_lazy_module"] is not None else "sin cargar"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+def lazy_import(name: str):
+    """El módulo si ya está importado; si no, un proxy que lo importa al primer uso."""
+    return sys.modules.get(name) or LazyModule(name)
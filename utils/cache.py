@@ -0,0 +1,178 @@
+# utils/cache.py
+# ------------------------------------------------------------
+# Caché de proceso para artifacts (.joblib) y datasets
+# - Clave: ruta absoluta + mtime + tamaño (se invalida si el archivo cambia)
+# - LRU con tamaño máximo para acotar memoria
+# - Thread-safe (sesiones concurrentes de Streamlit comparten el proceso)
+# - Contadores de hits/misses y warm-up al arrancar (también en segundo plano)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from utils._lazy import lazy_import
+
+pd = lazy_import("pandas")  # pandas/joblib se importan en la primera carga, no al importar el módulo
+
+FileKey = Tuple[str, int, int]
+
+def file_signature(path: str | Path) -> FileKey:
+    """Firma barata del archivo: (ruta absoluta, mtime_ns, tamaño)."""
+    p = os.path.abspath(os.fspath(path))
+    st = os.stat(p)
+    return p, st.st_mtime_ns, st.st_size
+
+class FileCache:
+    """
+    Caché LRU de objetos cargados desde archivo.
+    Si el archivo cambia (mtime/tamaño) la entrada vieja se descarta y se recarga.
+    Los objetos se comparten entre llamadas: no deben mutarse.
+    """
+
+    def __init__(self, loader: Callable[[str], Any], maxsize: int = 8):
+        self.loader = loader
+        self.maxsize = max(1, int(maxsize))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[FileKey, Any]" = OrderedDict()
+        self._derived: Dict[Tuple[FileKey, str], Any] = {}
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+
+    def get(self, path: str | Path) -> Any:
+        key = file_signature(path)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            # Un lock por ruta: dos sesiones pidiendo el mismo artifact cargan una sola vez
+            path_lock = self._loading.setdefault(key[0], threading.Lock())
+
+        with path_lock:
+            with self._lock:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return self._data[key]
+                self.misses += 1
+            value = self.loader(key[0])
+            with self._lock:
+                # Descarta versiones anteriores del mismo archivo
+                for old in [k for k in self._data if k[0] == key[0]]:
+                    self._drop(old)
+                self._data[key] = value
+                while len(self._data) > self.maxsize:
+                    self._drop(next(iter(self._data)))
+                    self.evictions += 1
+            return value
+
+    def _drop(self, key: FileKey) -> None:
+        del self._data[key]
+        for dk in [dk for dk in self._derived if dk[0] == key]:
+            del self._derived[dk]
+
+    def derived(self, path: str | Path, name: str, fn: Callable[[Any], Any]) -> Any:
+        """
+        Objeto derivado de la entrada (p. ej. un índice) calculado una vez por versión
+        del archivo y descartado junto con ella.
+        """
+        base = self.get(path)
+        key = (file_signature(path), name)
+        with self._lock:
+            if key in self._derived:
+                return self._derived[key]
+        value = fn(base)
+        with self._lock:
+            if key[0] in self._data:
+                value = self._derived.setdefault(key, value)
+        return value
+
+    def contains(self, path: str | Path) -> bool:
+        """True si la versión actual del archivo ya está en caché (no cuenta como hit)."""
+        key = file_signature(path)
+        with self._lock:
+            return key in self._data
+
+    def warm_up(self, paths: Iterable[str | Path]) -> Dict[str, bool]:
+        """Precarga rutas existentes; devuelve {ruta: cargada}."""
+        out = {}
+        for p in paths:
+            if p and os.path.exists(p):
+                if not self.contains(p):
+                    self.get(p)
+                out[str(p)] = True
+            else:
+                out[str(p)] = False
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._derived.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "size": len(self._data),
+                    "maxsize": self.maxsize}
+
+def _load_joblib(path: str) -> Any:
+    from joblib import load
+    return load(path)
+
+def _read_table(path: str) -> pd.DataFrame:
+    if path.lower().endswith(".parquet"):
+        return pd.read_parquet(path, memory_map=True)
+    return pd.read_csv(path)
+
+# Instancias compartidas por todo el proceso
+ARTIFACT_CACHE = FileCache(_load_joblib, maxsize=int(os.getenv("ARTIFACT_CACHE_SIZE", "6")))
+DATASET_CACHE = FileCache(_read_table, maxsize=int(os.getenv("DATASET_CACHE_SIZE", "2")))
+
+def load_artifact(path: str | Path) -> Any:
+    """joblib.load con caché de proceso."""
+    return ARTIFACT_CACHE.get(path)
+
+def load_table(path: str | Path) -> pd.DataFrame:
+    """Lee CSV/Parquet con caché de proceso (no mutar el resultado)."""
+    return DATASET_CACHE.get(path)
+
+def warm_up(artifact_paths: Iterable[str | Path] = (), dataset_paths: Iterable[str | Path] = ()) -> Dict[str, bool]:
+    out = ARTIFACT_CACHE.warm_up(artifact_paths)
+    out.update(DATASET_CACHE.warm_up(dataset_paths))
+    return out
+
+_BACKGROUND: Dict[Tuple, threading.Thread] = {}
+_BACKGROUND_LOCK = threading.Lock()
+
+def warm_up_async(artifact_paths: Iterable[str | Path] = (), dataset_paths: Iterable[str | Path] = (),
+                  then: Callable[[], Any] | None = None) -> threading.Thread:
+    """
+    warm_up en un hilo de fondo, una vez por conjunto de rutas en el proceso:
+    el primer render no espera a pandas/sklearn ni a los artifacts. `then` corre al terminar.
+    """
+    key = (tuple(str(p) for p in artifact_paths), tuple(str(p) for p in dataset_paths))
+    with _BACKGROUND_LOCK:
+        thread = _BACKGROUND.get(key)
+        if thread is None:
+            def run():
+                try:
+                    warm_up(*key)
+                    if then is not None:
+                        then()
+                except Exception:
+                    pass
+            thread = threading.Thread(target=run, name="coffee-warm-up", daemon=True)
+            _BACKGROUND[key] = thread
+            thread.start()
+    return thread
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    return {"artifacts": ARTIFACT_CACHE.stats(), "datasets": DATASET_CACHE.stats()}
@@ -0,0 +1,185 @@
+# utils/chat.py
+# ------------------------------------------------------------
+# Chat del CoffeeBot para app.py
+# - Cliente persistente por (backend, API key, modelo): configure/GenerativeModel una sola vez
+# - Ventana de historial acotada (solo los últimos N mensajes viajan al modelo)
+# - Respuesta en streaming (generador de fragmentos de texto)
+# - Caché LRU de respuestas por (modelo, hash del historial en ventana, prompt normalizado):
+#   la misma pregunta en otra conversación no reutiliza la respuesta (solo coinciden
+#   los primeros turnos, cuyo contexto es igual para todas las sesiones)
+# - Backend stub local para pruebas sin red (CHAT_BACKEND=stub)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+Message = Dict[str, str]
+
+HISTORY_WINDOW = int(os.getenv("CHAT_HISTORY_WINDOW", "20"))
+RESPONSE_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "128"))
+
+def normalize_prompt(text: str) -> str:
+    """Minúsculas y espacios colapsados: 'Hola   Mundo ' == 'hola mundo'."""
+    return " ".join(str(text).split()).casefold()
+
+def history_hash(history: Sequence[Message]) -> str:
+    """SHA-256 de (rol, contenido) de los mensajes: identifica el contexto que ve el modelo."""
+    payload = json.dumps([[m.get("role"), m.get("content")] for m in history], ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def window(history: Sequence[Message], max_messages: int = HISTORY_WINDOW) -> List[Message]:
+    """Mensajes de sistema + los últimos `max_messages` de la conversación."""
+    msgs = [m for m in history if m.get("role") in ("system", "user", "assistant")]
+    system = [m for m in msgs if m["role"] == "system"]
+    rest = [m for m in msgs if m["role"] != "system"]
+    return system + (rest[-max_messages:] if max_messages > 0 else [])
+
+# -----------------------
+# Backends
+# -----------------------
+
+class GeminiBackend:
+    """google.generativeai: se importa y configura solo al crear el primer cliente."""
+
+    name = "gemini"
+    _configured_key = None
+    _configure_lock = threading.Lock()
+
+    def __init__(self, api_key: str, model_name: str):
+        if not api_key:
+            raise RuntimeError("Falta GEMINI_API_KEY (configúralo en la barra lateral).")
+        import google.generativeai as genai
+        # configure es global en el SDK: solo se repite si cambia la key
+        with GeminiBackend._configure_lock:
+            if GeminiBackend._configured_key != api_key:
+                genai.configure(api_key=api_key)
+                GeminiBackend._configured_key = api_key
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def stream(self, history: Sequence[Message], text: str) -> Iterator[str]:
+        # Convertir historial a formato Gemini (system viaja como user)
+        gem_history = [{"role": "model" if m["role"] == "assistant" else "user", "parts": [m["content"]]}
+                       for m in history]
+        chat = self.model.start_chat(history=gem_history)
+        for chunk in chat.send_message(text, stream=True):
+            piece = getattr(chunk, "text", "")
+            if piece:
+                yield piece
+
+class StubBackend:
+    """Respuesta determinista palabra por palabra; no usa red ni API key."""
+
+    name = "stub"
+
+    def __init__(self, api_key: str = "", model_name: str = "stub", delay: float = 0.0):
+        self.model_name = model_name
+        self.delay = delay
+        self.calls = 0
+        self.last_history: List[Message] = []
+
+    def stream(self, history: Sequence[Message], text: str) -> Iterator[str]:
+        self.calls += 1
+        self.last_history = list(history)
+        reply = f"[{self.model_name}] ({len(history)} mensajes de contexto) {text}"
+        for i, word in enumerate(reply.split(" ")):
+            if self.delay:
+                time.sleep(self.delay)
+            yield (" " if i else "") + word
+
+BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend}
+
+# -----------------------
+# Cliente
+# -----------------------
+
+class ChatClient:
+    """
+    Envuelve un backend con ventana de historial y caché LRU de respuestas.
+    La clave incluye el historial en ventana: el cliente se comparte entre sesiones y una
+    respuesta solo se reutiliza con el mismo contexto exacto.
+    La caché se consulta antes de llamar al modelo; la respuesta se guarda al terminar el stream.
+    """
+
+    def __init__(self, backend, max_messages: int = HISTORY_WINDOW, cache_size: int = RESPONSE_CACHE_SIZE):
+        self.backend = backend
+        self.max_messages = max_messages
+        self.cache_size = max(0, int(cache_size))
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key: Tuple[str, str, str]):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+            return None
+
+    def _store(self, key: Tuple[str, str, str], text: str) -> None:
+        if not self.cache_size or not text:
+            return
+        with self._lock:
+            self._cache[key] = text
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stream(self, history: Sequence[Message], user_text: str) -> Iterator[str]:
+        """Fragmentos de la respuesta; `history` puede incluir ya el mensaje actual del usuario."""
+        hist = list(history)
+        if hist and hist[-1].get("role") == "user" and hist[-1].get("content") == user_text:
+            hist = hist[:-1]  # no enviar dos veces el prompt actual
+        context = window(hist, self.max_messages)
+        key = (self.backend.model_name, history_hash(context), normalize_prompt(user_text))
+        cached = self._cached(key)
+        if cached is not None:
+            yield cached
+            return
+        parts: List[str] = []
+        for piece in self.backend.stream(context, user_text):
+            parts.append(piece)
+            yield piece
+        self._store(key, "".join(parts))
+
+    def send(self, history: Sequence[Message], user_text: str) -> str:
+        return "".join(self.stream(history, user_text))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._cache),
+                    "maxsize": self.cache_size, "window": self.max_messages}
+
+_CLIENTS: "OrderedDict[Tuple[str, str, str], ChatClient]" = OrderedDict()
+_CLIENTS_LOCK = threading.Lock()
+MAX_CLIENTS = 8
+
+def get_client(api_key: str, model_name: str, backend: str | None = None) -> ChatClient:
+    """Cliente compartido por proceso para (backend, API key, modelo); la key se guarda como hash."""
+    backend = (backend or os.getenv("CHAT_BACKEND", "gemini")).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de chat desconocido: {backend}")
+    key = (backend, hashlib.sha256((api_key or "").encode()).hexdigest(), model_name)
+    with _CLIENTS_LOCK:
+        if key in _CLIENTS:
+            _CLIENTS.move_to_end(key)
+            return _CLIENTS[key]
+    client = ChatClient(BACKENDS[backend](api_key, model_name))
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.setdefault(key, client)
+        while len(_CLIENTS) > MAX_CLIENTS:
+            _CLIENTS.popitem(last=False)
+    return client
+
+def chat_stats() -> Dict[str, Dict[str, int]]:
+    with _CLIENTS_LOCK:
+        return {f"{b}:{m}:{h[:8]}": c.stats() for (b, h, m), c in _CLIENTS.items()}
@@ -0,0 +1,46 @@
+# utils/client.py
+# ------------------------------------------------------------
+# Cliente liviano del servicio de predicción (utils/server.py)
+# - Solo stdlib (urllib + json): no importa pandas/sklearn
+# - Mismo formato de respuesta que predict_with_artifact
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import json
+import urllib.error
+import urllib.request
+from typing import Dict, Iterable, List, Optional, Tuple
+
+class PredictionClient:
+    def __init__(self, base_url: str, timeout: float = 10.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path: str, payload: Optional[Dict] = None) -> Dict:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data,
+                                     headers={"Content-Type": "application/json"},
+                                     method="POST" if data is not None else "GET")
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            # El servidor responde {"error": ...} también en 4xx/5xx
+            try:
+                msg = json.loads(e.read()).get("error", str(e))
+            except Exception:
+                msg = str(e)
+            raise RuntimeError(msg) from None
+
+    def predict(self, target: str, country: str, ctype: str, year: int) -> Dict:
+        return self._request("/predict", {"target": target, "country": country, "type": ctype, "year": int(year)})
+
+    def predict_many(self, target: str, queries: Iterable[Tuple[str, str, int]]) -> List[Dict]:
+        qs = [{"country": c, "type": t, "year": int(y)} for c, t, y in queries]
+        return self._request("/predict/batch", {"target": target, "queries": qs})["predictions"]
+
+    def health(self) -> Dict:
+        return self._request("/health")
+
+    def metrics(self) -> Dict:
+        return self._request("/metrics")
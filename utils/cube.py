@@ -0,0 +1,189 @@
+# utils/cube.py
+# ------------------------------------------------------------
+# Cubo materializado de pronósticos (year × country × type) por artifact
+# - Precalcula todas las combinaciones del dataset hasta `horizon` años después del último
+#   observado (una sola llamada a predict_many) con bandas PI80/PI95
+# - Parquet columnar cuyo nombre y metadata llevan el hash del artifact y del dataset
+# - Consulta O(1) (dict en memoria, caché de proceso); si falta el cubo o la tupla → inferencia en vivo
+# - Si cambia el .joblib o el dataset cambia el hash: el cubo viejo deja de usarse y el nuevo
+#   se construye en segundo plano
+# Ejecuta: python -m utils.cube [--horizon 5] [--data data/coffee_clean.csv]
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import FileCache, file_signature
+from utils.inference import GroupIndex, load_context, predict_many, predict_with_artifact
+from utils.io import inputs_hash
+from utils.tracing import count, span
+
+CUBE_DIR = os.getenv("CUBE_DIR", "cache/cube")  # derivado y regenerable: fuera de models/ (ver .gitignore)
+CUBE_HORIZON = int(os.getenv("CUBE_HORIZON", "5"))
+CUBE_META_KEY = b"coffee_cube"
+BANDS = ("lo80", "hi80", "lo95", "hi95")
+
+@lru_cache(maxsize=64)
+def _hash_for(sig: Tuple[str, int, int]) -> str:
+    return inputs_hash([sig[0]])
+
+def file_hash(path: str | Path) -> str:
+    """SHA-256 del contenido, recalculado solo si cambian mtime/tamaño."""
+    return _hash_for(file_signature(path))
+
+def cube_path(data_path: str | Path, artifact_path: str | Path, out_dir: str | Path = CUBE_DIR) -> Path:
+    """Ruta del cubo para esta versión del artifact y del dataset."""
+    stem = Path(artifact_path).stem  # price_model.flat.joblib → price_model.flat
+    return Path(out_dir) / f"{stem}-{file_hash(artifact_path)[:12]}-{file_hash(data_path)[:12]}.parquet"
+
+class ForecastCube:
+    """Tabla de pronósticos en memoria con búsqueda O(1) por (year, country, type)."""
+
+    def __init__(self, table: pd.DataFrame, meta: Dict):
+        self.meta = meta
+        self.years = table["year"].to_numpy(dtype=np.int64)
+        self.countries = table["country"].astype(str).to_numpy(dtype=object)
+        self.types = table["type"].astype(str).to_numpy(dtype=object)
+        self.pred = table["pred"].to_numpy(dtype=float)
+        self.bands = {b: table[b].to_numpy(dtype=float) for b in BANDS if b in table.columns}
+        self.rows = {(int(y), c.casefold(), t.casefold()): i
+                     for i, (y, c, t) in enumerate(zip(self.years, self.countries, self.types))}
+
+    def __len__(self) -> int:
+        return len(self.pred)
+
+    def get(self, year: int, country: str, ctype: str) -> Optional[Dict]:
+        """Mismo formato que predict_with_artifact, o None si la tupla no está en el cubo."""
+        i = self.rows.get((int(year), str(country).casefold(), str(ctype).casefold()))
+        if i is None:
+            return None
+        out = {"pred": float(self.pred[i]),
+               "group": {"country": self.countries[i], "type": self.types[i], "year": int(self.years[i])}}
+        for b, values in self.bands.items():
+            out[b] = float(values[i])
+        return out
+
+def _load_cube(path: str) -> ForecastCube:
+    import pyarrow.parquet as pq
+    table = pq.read_table(path)
+    meta = json.loads((table.schema.metadata or {}).get(CUBE_META_KEY, b"{}"))
+    return ForecastCube(table.to_pandas(), meta)
+
+CUBE_CACHE = FileCache(_load_cube, maxsize=int(os.getenv("CUBE_CACHE_SIZE", "6")))
+
+def build_cube(data_path: str | Path, artifact_path: str | Path, horizon: int = CUBE_HORIZON,
+               out_dir: str | Path = CUBE_DIR) -> Path:
+    """
+    Puntúa todas las tuplas (year, country, type) de los grupos del dataset, desde el
+    primer año hasta último + horizon, y guarda el cubo (reemplaza versiones anteriores).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = cube_path(data_path, artifact_path, out_dir)
+    df, index = load_context(data_path)
+    groups = df[["country", "type"]].dropna().drop_duplicates()
+    years = np.arange(int(df["year"].min()), int(df["year"].max()) + int(horizon) + 1)
+    queries = pd.DataFrame({
+        "country": np.repeat(groups["country"].to_numpy(dtype=object), len(years)),
+        "type": np.repeat(groups["type"].to_numpy(dtype=object), len(years)),
+        "year": np.tile(years, len(groups)),
+    })
+    with span("cube.build"):
+        res = predict_many(df, str(artifact_path), queries, index=index)
+    y_col = res.columns[3][len("pred_"):]
+    res = res.rename(columns={f"pred_{y_col}": "pred", **{f"pred_{y_col}_{b}": b for b in BANDS}})
+    res["year"] = res["year"].astype("int16")
+    res["country"] = res["country"].astype("category")
+    res["type"] = res["type"].astype("category")
+
+    meta = {"artifact": str(artifact_path), "artifact_hash": file_hash(artifact_path),
+            "dataset": str(data_path), "dataset_hash": file_hash(data_path),
+            "y_col": y_col, "horizon": int(horizon), "built_at": time.time()}
+    table = pa.Table.from_pandas(res, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           CUBE_META_KEY: json.dumps(meta).encode()})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".tmp{os.getpid()}.{threading.get_ident()}")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)  # atómico: los lectores nunca ven un cubo a medio escribir
+    stem = path.name.rsplit("-", 2)[0]
+    for old in path.parent.glob(f"{stem}-*.parquet"):
+        if old != path and old.name.rsplit("-", 2)[0] == stem:
+            old.unlink(missing_ok=True)
+    return path
+
+_BUILDS: Dict[Path, threading.Thread] = {}
+_BUILDS_LOCK = threading.Lock()
+
+def build_cube_async(data_path: str | Path, artifact_path: str | Path, horizon: int = CUBE_HORIZON,
+                     out_dir: str | Path = CUBE_DIR) -> threading.Thread:
+    """build_cube en un hilo de fondo, una vez por versión (hashes) de artifact y dataset."""
+    key = cube_path(data_path, artifact_path, out_dir)
+    with _BUILDS_LOCK:
+        thread = _BUILDS.get(key)
+        if thread is None:
+            def run():
+                try:
+                    build_cube(data_path, artifact_path, horizon, out_dir)
+                except Exception:
+                    count("cube.build_errors")
+            thread = threading.Thread(target=run, name="coffee-cube-build", daemon=True)
+            _BUILDS[key] = thread
+            thread.start()
+    return thread
+
+def current_cube(data_path: str | Path, artifact_path: str | Path, out_dir: str | Path = CUBE_DIR,
+                 horizon: int = CUBE_HORIZON, auto_build: bool = True) -> Optional[ForecastCube]:
+    """Cubo vigente para (artifact, dataset); si no existe agenda su construcción y devuelve None."""
+    path = cube_path(data_path, artifact_path, out_dir)
+    if path.exists():
+        return CUBE_CACHE.get(path)
+    if auto_build:
+        build_cube_async(data_path, artifact_path, horizon, out_dir)
+    return None
+
+def predict_cached(df_all: pd.DataFrame, data_path: str | Path, artifact_path: str, year: int,
+                   country: str, ctype: str, index: Optional[GroupIndex] = None,
+                   out_dir: str | Path = CUBE_DIR, horizon: int = CUBE_HORIZON) -> Dict:
+    """predict_with_artifact servido desde el cubo; en un miss predice en vivo."""
+    with span("cube.lookup"):
+        cube = current_cube(data_path, artifact_path, out_dir, horizon) if os.path.exists(artifact_path) else None
+        hit = cube.get(year, country, ctype) if cube is not None else None
+    if hit is not None:
+        count("cube.hits")
+        return hit
+    count("cube.misses")
+    return predict_with_artifact(df_all, artifact_path, year, country, ctype, index=index)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    default_clean = "data/coffee_clean.parquet" if os.path.exists("data/coffee_clean.parquet") else "data/coffee_clean.csv"
+    ap = argparse.ArgumentParser(description="Precalcula el cubo de pronósticos (country × type × year)")
+    ap.add_argument("--data", default=os.getenv("DATA_CLEAN", default_clean))
+    ap.add_argument("--art-price", default=os.getenv("ART_PRICE", "models/price_model.joblib"))
+    ap.add_argument("--art-consumption", default=os.getenv("ART_CONSUMPTION", "models/consumption_model.joblib"))
+    ap.add_argument("--art-profit", default=os.getenv("ART_PROFIT", "models/profit_model.joblib"))
+    ap.add_argument("--horizon", type=int, default=CUBE_HORIZON, help="años después del último observado")
+    ap.add_argument("--out", default=CUBE_DIR)
+    args = ap.parse_args(argv)
+
+    for art in (args.art_price, args.art_consumption, args.art_profit):
+        if not os.path.exists(art):
+            print(f"⚠️  Sin artifact: {art}")
+            continue
+        t0 = time.perf_counter()
+        path = build_cube(args.data, art, args.horizon, args.out)
+        print(f"✅ {path} ({len(CUBE_CACHE.get(path)):,} filas, {time.perf_counter() - t0:.2f}s)")
+
+if __name__ == "__main__":
+    main()
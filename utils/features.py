@@ -0,0 +1,221 @@
+# utils/features.py
+# ------------------------------------------------------------
+# Features causales por grupo (country, type) para los modelos
+# - Rezagos y medias móviles solo con pasado (shift vectorizado por grupo)
+# - Codificación estable de categorías con un codebook de enteros
+# - Cálculo incremental de las filas de años nuevos
+# - One-hot disperso (CSR) alineado a feat_cols para el fallback con dummies
+# ------------------------------------------------------------
+
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils._lazy import lazy_import
+
+sparse = lazy_import("scipy.sparse")  # solo para el one-hot disperso (DummyEncoder)
+
+GROUP_COLS = ["country", "type"]
+LAGS = (1, 2)
+WINDOWS = (2, 3, 5)
+
+Codebook = Dict[str, List[str]]
+
+def make_codebook(df: pd.DataFrame, cols: Sequence[str] = GROUP_COLS) -> Codebook:
+    """Valores únicos ordenados por columna; el código de un valor es su posición."""
+    return {c: sorted(df[c].dropna().astype(str).unique().tolist()) for c in cols if c in df.columns}
+
+def encode(values: pd.Series, categories: Sequence[str]) -> np.ndarray:
+    """Códigos enteros según el codebook (-1 para valores desconocidos)."""
+    cat = pd.Categorical(values.astype(str), categories=list(categories))
+    return cat.codes.astype(np.int32)
+
+def feature_names(y_col: str, lag_cols: Optional[Iterable[str]] = None,
+                  lags: Sequence[int] = LAGS, windows: Sequence[int] = WINDOWS,
+                  group_cols: Sequence[str] = GROUP_COLS) -> List[str]:
+    """Columnas que produce build_xy (en orden)."""
+    names = ["year"] + [f"{c}_code" for c in group_cols]
+    for col in (lag_cols or [y_col]):
+        names += [f"{col}_lag{L}" for L in lags]
+        names += [f"{col}_ma{w}" for w in windows]
+    return names
+
+def log1p_nonneg(X):
+    """
+    log1p sobre valores recortados a >= 0: rezagos/medias de un target entrenado en log1p.
+    Vive aquí (no en utils.train) para que el pipeline se serialice como utils.features.log1p_nonneg.
+    """
+    return np.log1p(np.clip(X, 0, None))
+
+def _group_layout(df: pd.DataFrame, group_cols: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Orden (grupo, year) y posición de cada fila dentro de su grupo en ese orden.
+    """
+    if len(df) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    keys = [pd.factorize(df[c].astype(str))[0] for c in group_cols if c in df.columns]
+    year = pd.to_numeric(df["year"], errors="coerce").to_numpy(dtype=float)
+    order = np.lexsort((year, *reversed(keys))) if keys else np.argsort(year, kind="stable")
+    if keys:
+        gid = np.zeros(len(df), dtype=np.int64)
+        for k in keys:
+            gid = gid * (k.max() + 2) + (k + 1)
+        g_sorted = gid[order]
+        new_group = np.r_[True, g_sorted[1:] != g_sorted[:-1]]
+    else:
+        new_group = np.r_[True, np.zeros(len(df) - 1, dtype=bool)] if len(df) else np.array([], dtype=bool)
+    starts = np.flatnonzero(new_group)
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(df)]))
+    pos_in_group = np.arange(len(df)) - group_start
+    return order, pos_in_group
+
+def _lag_and_rolling(values: np.ndarray, order: np.ndarray, pos_in_group: np.ndarray,
+                     lags: Sequence[int], windows: Sequence[int]) -> Dict[str, np.ndarray]:
+    """Rezagos y medias móviles del pasado (sin la fila actual), en el orden original."""
+    n = len(values)
+    v = values[order]
+    idx = np.arange(n)
+    out: Dict[str, np.ndarray] = {}
+    for L in lags:
+        lag = np.full(n, np.nan)
+        ok = pos_in_group >= L
+        lag[ok] = v[idx[ok] - L]
+        out[f"lag{L}"] = lag
+    # Sumas acumuladas ignorando NaN (como rolling(..., min_periods=1).mean())
+    valid = ~np.isnan(v)
+    cs = np.r_[0.0, np.cumsum(np.where(valid, v, 0.0))]
+    cc = np.r_[0, np.cumsum(valid)]
+    start = idx - pos_in_group
+    for w in windows:
+        lo = np.maximum(idx - w, start)
+        cnt = cc[idx] - cc[lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ma = (cs[idx] - cs[lo]) / cnt
+        ma[cnt == 0] = np.nan
+        out[f"ma{w}"] = ma
+    # Regresa al orden original de las filas
+    inv = np.empty(n, dtype=np.int64)
+    inv[order] = idx
+    return {k: a[inv] for k, a in out.items()}
+
+def build_xy(df: pd.DataFrame, y_col: str, lag_cols: Optional[Iterable[str]] = None,
+             lags: Sequence[int] = LAGS, windows: Sequence[int] = WINDOWS,
+             codebook: Optional[Codebook] = None,
+             group_cols: Sequence[str] = GROUP_COLS) -> Tuple[pd.DataFrame, Optional[pd.Series], List[str]]:
+    """
+    X (mismo índice y orden que df), y y lista de features.
+    Features: year, códigos de country/type y, por cada columna de `lag_cols`
+    (por defecto solo y_col), rezagos y medias móviles del pasado dentro de cada grupo.
+    """
+    lag_cols = list(lag_cols or [y_col])
+    codebook = codebook if codebook is not None else make_codebook(df, group_cols)
+    order, pos_in_group = _group_layout(df, group_cols)
+
+    data = {"year": pd.to_numeric(df["year"], errors="coerce").to_numpy(dtype=float)}
+    for c in group_cols:
+        data[f"{c}_code"] = encode(df[c], codebook.get(c, [])) if c in df.columns else np.full(len(df), -1, np.int32)
+    for col in lag_cols:
+        values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float) if col in df.columns else np.full(len(df), np.nan)
+        for name, arr in _lag_and_rolling(values, order, pos_in_group, lags, windows).items():
+            data[f"{col}_{name}"] = arr
+
+    X = pd.DataFrame(data, index=df.index)
+    feat_cols = feature_names(y_col, lag_cols, lags, windows, group_cols)
+    y = df[y_col] if y_col in df.columns else None
+    return X[feat_cols], y, feat_cols
+
+def build_xy_increment(df_hist: pd.DataFrame, df_new: pd.DataFrame, y_col: str,
+                       lag_cols: Optional[Iterable[str]] = None,
+                       lags: Sequence[int] = LAGS, windows: Sequence[int] = WINDOWS,
+                       codebook: Optional[Codebook] = None,
+                       group_cols: Sequence[str] = GROUP_COLS) -> pd.DataFrame:
+    """
+    Features solo para las filas de `df_new` (p. ej. un año nuevo), usando del histórico
+    únicamente las últimas max(lags, windows) filas de cada grupo.
+    Si alguna fila nueva no es posterior al histórico de su grupo, recalcula sobre todo.
+    """
+    codebook = codebook if codebook is not None else make_codebook(pd.concat([df_hist, df_new]), group_cols)
+    depth = max(list(lags) + list(windows))
+    keys = [c for c in group_cols if c in df_hist.columns]
+
+    if keys and len(df_new):
+        last_year = pd.to_numeric(df_hist["year"], errors="coerce").groupby(
+            [df_hist[k].astype(str) for k in keys]).max()
+        prev = pd.MultiIndex.from_frame(df_new[keys].astype(str)) if len(keys) > 1 else pd.Index(df_new[keys[0]].astype(str))
+        last = last_year.reindex(prev).to_numpy(dtype=float)
+        new_year = pd.to_numeric(df_new["year"], errors="coerce").to_numpy(dtype=float)
+        in_order = bool(np.all(np.isnan(last) | (new_year > last)))
+    else:
+        in_order = True
+
+    if in_order:
+        hist = df_hist.sort_values("year", kind="stable").groupby(keys, observed=True).tail(depth) if keys else df_hist.tail(depth)
+    else:
+        hist = df_hist
+    new = df_new.copy()
+    new.index = pd.RangeIndex(len(new)) + (-len(new))  # etiquetas que no chocan con el histórico
+    frame = pd.concat([hist, new])
+    X, _, _ = build_xy(frame, y_col, lag_cols, lags, windows, codebook, group_cols)
+    X = X.loc[new.index]
+    X.index = df_new.index
+    return X
+
+class DummyEncoder:
+    """
+    One-hot disperso con los mismos nombres que pd.get_dummies ('country_Brazil', ...),
+    alineado a `feat_cols`: numéricas tal cual y una columna por categoría conocida.
+    Valores desconocidos quedan en cero (como las columnas rellenadas con 0).
+    Se guarda en el artifact (clave 'encoder').
+    """
+
+    def __init__(self, feat_cols: Sequence[str], cat_cols: Sequence[str] = GROUP_COLS):
+        self.feat_cols = list(feat_cols)
+        self.cat_cols = [c for c in cat_cols]
+        self.num_cols: List[Tuple[int, str]] = []
+        self.categories: Dict[str, Dict[str, int]] = {c: {} for c in self.cat_cols}
+        for j, name in enumerate(self.feat_cols):
+            col = next((c for c in self.cat_cols if name.startswith(f"{c}_")), None)
+            if col is None:
+                self.num_cols.append((j, name))
+            else:
+                self.categories[col][name[len(col) + 1:]] = j
+
+    @classmethod
+    def fit(cls, df: pd.DataFrame, num_cols: Sequence[str] = ("year",),
+            cat_cols: Sequence[str] = GROUP_COLS) -> "DummyEncoder":
+        """Columnas en el orden de get_dummies: numéricas y luego categorías ordenadas."""
+        cat_cols = [c for c in cat_cols if c in df.columns]
+        feat_cols = [c for c in num_cols if c in df.columns]
+        for c in cat_cols:
+            feat_cols += [f"{c}_{v}" for v in sorted(df[c].dropna().astype(str).unique())]
+        return cls(feat_cols, cat_cols)
+
+    def transform(self, df: pd.DataFrame) -> sparse.csr_matrix:
+        """Matriz CSR (filas × len(feat_cols)); memoria proporcional a las filas."""
+        n = len(df)
+        rows, cols, vals = [], [], []
+        for j, name in self.num_cols:
+            if name not in df.columns:
+                continue
+            v = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float)
+            nz = np.flatnonzero(v != 0)  # NaN también se guarda (v != 0)
+            rows.append(nz); cols.append(np.full(len(nz), j)); vals.append(v[nz])
+        for c, mapping in self.categories.items():
+            if c not in df.columns or not mapping:
+                continue
+            names = list(mapping)
+            codes = pd.Categorical(df[c].astype(str), categories=names).codes
+            hit = np.flatnonzero(codes >= 0)
+            col_idx = np.fromiter((mapping[x] for x in names), dtype=np.int64, count=len(names))
+            rows.append(hit); cols.append(col_idx[codes[hit]]); vals.append(np.ones(len(hit)))
+        if rows:
+            r, c_, v = np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+        else:
+            r = c_ = np.array([], dtype=np.int64); v = np.array([], dtype=float)
+        return sparse.csr_matrix((v, (r, c_)), shape=(n, len(self.feat_cols)))
+
+    def transform_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Igual que transform pero como DataFrame disperso (índice y nombres de df)."""
+        return pd.DataFrame.sparse.from_spmatrix(self.transform(df), index=df.index, columns=self.feat_cols)
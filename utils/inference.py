@@ -0,0 +1,421 @@
+# utils/inference.py
+# ------------------------------------------------------------
+# Inferencia con los artifacts .joblib (usado por app.py y jobs batch)
+# - Carga de artifacts (dict "rico" o estimador directo)
+# - Construcción de features (build_xy del repo o fallback con dummies)
+# - Predicción puntual y en lote con bandas PI80/PI95
+# - Pronóstico recursivo multi-año (los lags se alimentan con las predicciones)
+# - Etapas instrumentadas con utils.tracing (carga, lookup, features, predict)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import os
+import re
+import threading
+import warnings
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from utils._lazy import lazy_import
+from utils.cache import DATASET_CACHE, file_signature, load_artifact
+from utils.features import DummyEncoder
+from utils.tracing import count, span, traced
+
+sparse = lazy_import("scipy.sparse")  # solo para anotaciones: scipy se importa al evaluarlas
+
+BASE_COLS = ["year", "country", "type"]
+
+def ensure_basic_cols(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    if "Country" in df.columns and "country" not in df.columns:
+        df = df.rename(columns={"Country": "country"})
+    if "Coffee type" in df.columns and "type" not in df.columns:
+        df = df.rename(columns={"Coffee type": "type"})
+    if "año" in df.columns and "year" not in df.columns:
+        df = df.rename(columns={"año": "year"})
+    if "year" in df.columns:
+        df["year"] = pd.to_numeric(df["year"], errors="coerce").astype("Int64")
+    if "country" in df.columns:
+        df["country"] = df["country"].astype(str)
+    if "type" in df.columns:
+        df["type"] = df["type"].astype(str)
+    return df
+
+def try_import_build_xy():
+    try:
+        from utils.features import build_xy  # si existe en tu repo
+        return build_xy
+    except Exception:
+        return None
+
+def build_features_fallback(df_all: pd.DataFrame, y_col: str, feat_cols: Optional[list],
+                            encoder: Optional[DummyEncoder] = None) -> Tuple[sparse.csr_matrix, Optional[pd.Series], list]:
+    """
+    Fallback sin lags: year + one-hot de country/type como matriz CSR alineada a feat_cols
+    (encoder del artifact o reconstruido desde los nombres de feat_cols).
+    """
+    if encoder is None:
+        if feat_cols:
+            encoder = DummyEncoder(feat_cols)
+            present = [c for _, c in encoder.num_cols if c in df_all.columns]
+            present += [c for c, m in encoder.categories.items() if m and c in df_all.columns]
+            if not present:
+                raise ValueError("feat_cols del artifact no existen en el dataframe.")
+        else:
+            if not any(c in df_all.columns for c in BASE_COLS):
+                raise ValueError("Faltan columnas mínimas (year/country/type).")
+            encoder = DummyEncoder.fit(df_all, num_cols=["year"])
+    X = encoder.transform(df_all)
+    y = df_all[y_col] if y_col in df_all.columns else None
+    return X, y, list(encoder.feat_cols)
+
+def infer_y_col_from_filename(path: str) -> str:
+    name = Path(path).name.lower()
+    if re.search(r"consum", name): return "consumption"
+    if re.search(r"(profit|util)", name): return "profit"
+    return "price"
+
+@traced("inference.load_artifact_info")
+def load_artifact_info(artifact_path: str):
+    art = load_artifact(artifact_path)
+    # Caso 1: dict con metadata
+    if isinstance(art, dict):
+        mdl = art.get("model")
+        y_col = art.get("y_col", "price")
+        feat_cols = art.get("feat_cols")
+        group_cols = art.get("group_cols", ["country", "type"])
+        q80 = art.get("PI80_abs"); q95 = art.get("PI95_abs")
+        return mdl, y_col, feat_cols, group_cols, q80, q95, art
+    # Caso 2: Pipeline/estimador directo
+    mdl = art
+    y_col = infer_y_col_from_filename(artifact_path)
+    feat_cols = None
+    try:
+        fni = getattr(mdl, "feature_names_in_", None)
+        if fni is not None:
+            feat_cols = list(fni)
+    except Exception:
+        pass
+    group_cols = ["country", "type"]
+    q80 = q95 = None
+    return mdl, y_col, feat_cols, group_cols, q80, q95, {"model": mdl}
+
+def pipeline_expects_raw(pipeline) -> bool:
+    # sklearn solo se importa si hace falta inspeccionar un Pipeline
+    from sklearn.pipeline import Pipeline
+    from sklearn.compose import ColumnTransformer
+    try:
+        if isinstance(pipeline, Pipeline):
+            for _, step in pipeline.steps:
+                if isinstance(step, ColumnTransformer):
+                    return True
+                if isinstance(step, Pipeline):
+                    for __, sub in step.steps:
+                        if isinstance(sub, ColumnTransformer):
+                            return True
+    except Exception:
+        pass
+    return False
+
+class GroupIndex:
+    """
+    Índice de grupos construido una vez por carga del dataset (ya normalizado con
+    ensure_basic_cols): tablas casefold → valor original para country/type y
+    diccionario (year, country, type) → etiqueta de fila. La búsqueda es O(1).
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.n_rows = len(df)
+        self._memo: Dict[object, object] = {}
+        self.lookup: Dict[str, Dict[str, str]] = {}
+        for col in ("country", "type"):
+            table: Dict[str, str] = {}
+            if col in df.columns:
+                for u in df[col].astype(str).unique():
+                    table.setdefault(u.casefold(), u)
+            self.lookup[col] = table
+        self.rows: Dict[Tuple[int, str, str], object] = {}
+        if all(c in df.columns for c in BASE_COLS):
+            valid = df["year"].notna().to_numpy()
+            years = df["year"].to_numpy()[valid].astype(int)
+            # dict(zip(...)) conserva la última fila si hay claves duplicadas
+            self.rows = dict(zip(zip(years.tolist(), df["country"].to_numpy()[valid].tolist(),
+                                     df["type"].to_numpy()[valid].tolist()),
+                                 df.index[valid]))
+
+    def memo(self, key, fn):
+        """Resultado derivado del dataset (p. ej. features) calculado una vez por índice."""
+        if key not in self._memo:
+            self._memo[key] = fn()
+        return self._memo[key]
+
+    def normalize(self, col: str, val) -> str:
+        table = self.lookup.get(col)
+        if not table:
+            return val
+        return table.get(str(val).casefold(), val)
+
+    def locate(self, year: int, country: str, ctype: str):
+        """Etiqueta de la fila (year, country, type) o None si no existe."""
+        return self.rows.get((int(year), country, ctype))
+
+def _make_context(raw: pd.DataFrame) -> Tuple[pd.DataFrame, GroupIndex]:
+    df = ensure_basic_cols(raw)
+    return df, GroupIndex(df)
+
+@traced("inference.load_context")
+def load_context(path: str | Path) -> Tuple[pd.DataFrame, GroupIndex]:
+    """Dataset normalizado + GroupIndex, construidos una vez por versión del archivo."""
+    return DATASET_CACHE.derived(path, "context", _make_context)
+
+def _feature_mode(mdl, y_col: str, feat_cols: Optional[list], art: dict) -> str:
+    """
+    'build_xy': el artifact se entrenó con utils.features (lags) → features cacheadas + incrementales.
+    'local'   : features fila a fila (fallback con dummies o Pipeline con ColumnTransformer).
+    'full'    : sin feat_cols; se construye sobre todo el dataset como antes.
+    """
+    if try_import_build_xy() is not None:
+        if not feat_cols:
+            return "full"
+        from utils.features import feature_names
+        if set(feat_cols) <= set(feature_names(y_col, art.get("lag_cols"))):
+            return "build_xy"
+    if pipeline_expects_raw(mdl) or feat_cols:
+        return "local"
+    return "full"
+
+def _build_feature_matrix(df_all: pd.DataFrame, mdl, y_col: str, feat_cols: Optional[list],
+                          try_build_xy: bool = True, encoder: Optional[DummyEncoder] = None):
+    """DataFrame (mismo índice que df_all) o CSR (mismo orden de filas que df_all)."""
+    build_xy = try_import_build_xy() if try_build_xy else None
+    if build_xy:
+        try:
+            X_all, _, _ = build_xy(df_all, y_col)
+        except Exception:
+            X_all, _, _ = build_features_fallback(df_all, y_col, feat_cols, encoder)
+    else:
+        if pipeline_expects_raw(mdl):
+            base = [c for c in BASE_COLS if c in df_all.columns]
+            if not base: raise ValueError("Faltan columnas mínimas (year/country/type).")
+            X_all = df_all[base].copy()
+        else:
+            X_all, _, _ = build_features_fallback(df_all, y_col, feat_cols, encoder)
+
+    # Alinear columnas esperadas (si el artifact las trae) en un solo reindex
+    if feat_cols and isinstance(X_all, pd.DataFrame) and list(X_all.columns) != list(feat_cols):
+        X_all = X_all.reindex(columns=feat_cols, fill_value=0)
+    return X_all
+
+def _predict(mdl, X) -> np.ndarray:
+    with warnings.catch_warnings():
+        # Modelos ajustados con DataFrame reciben CSR sin nombres de columnas (y al revés con utils.train)
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        warnings.filterwarnings("ignore", message="X has feature names")
+        return np.asarray(mdl.predict(X), dtype=float).ravel()
+
+class RecursiveForecaster:
+    """
+    Pronóstico recursivo año a año para artifacts con rezagos (modo build_xy): cada
+    predicción se agrega al estado y alimenta los lags/medias del año siguiente.
+    El estado es solo la cola de cada grupo (max(lags, windows) filas), así que cada
+    paso calcula las features de las filas nuevas con build_xy_increment.
+    Los horizontes ya resueltos se guardan: pedir 2030 después de 2028 solo calcula 2029 y 2030.
+    """
+
+    def __init__(self, df_all: pd.DataFrame, mdl, y_col: str, feat_cols: list,
+                 lag_cols: Optional[list] = None, codebook=None, group_cols: Optional[list] = None):
+        from utils.features import GROUP_COLS, LAGS, WINDOWS
+        self.mdl, self.y_col, self.feat_cols = mdl, y_col, list(feat_cols)
+        self.lag_cols, self.codebook = lag_cols, codebook
+        self.group_cols = [c for c in (group_cols or GROUP_COLS) if c in df_all.columns]
+        self.depth = max(list(LAGS) + list(WINDOWS))
+        cols = list(dict.fromkeys(["year", *self.group_cols, *(lag_cols or [y_col])]))
+        hist = df_all[[c for c in cols if c in df_all.columns]].dropna(subset=["year"])
+        hist = hist.sort_values("year", kind="stable")
+        self.tail = hist.groupby(self.group_cols, observed=True).tail(self.depth).reset_index(drop=True)
+        last = hist.groupby(self.group_cols, observed=True)["year"].max()
+        self.observed: Dict[tuple, int] = {k if isinstance(k, tuple) else (k,): int(v) for k, v in last.items()}
+        self.last_year = dict(self.observed)  # último año resuelto (observado o predicho)
+        self.paths: Dict[tuple, Dict[int, float]] = {g: {} for g in self.last_year}
+        self.steps = 0
+        self._lock = threading.Lock()
+
+    def covers(self, key: tuple) -> bool:
+        """True si (year, country, type) es un año futuro de un grupo conocido."""
+        g = tuple(key[1:1 + len(self.group_cols)])
+        return g in self.observed and int(key[0]) > self.observed[g]
+
+    def _advance(self, groups: List[tuple], until: Dict[tuple, int]) -> None:
+        from utils.features import build_xy_increment
+        while True:
+            todo = [g for g in groups if self.last_year[g] < until[g]]
+            if not todo:
+                return
+            new = pd.DataFrame({"year": [self.last_year[g] + 1 for g in todo]})
+            for j, c in enumerate(self.group_cols):
+                new[c] = [g[j] for g in todo]
+            X = build_xy_increment(self.tail, new, self.y_col, self.lag_cols, codebook=self.codebook,
+                                   group_cols=self.group_cols)
+            y_hat = _predict(self.mdl, X[self.feat_cols])
+            new[self.y_col] = y_hat
+            # La cola crece con las filas nuevas y se recorta a `depth` filas por grupo
+            self.tail = (pd.concat([self.tail, new], ignore_index=True)
+                           .groupby(self.group_cols, observed=True).tail(self.depth)
+                           .reset_index(drop=True))
+            for g, yr, v in zip(todo, new["year"].tolist(), y_hat.tolist()):
+                self.paths[g][int(yr)] = float(v)
+                self.last_year[g] = int(yr)
+            self.steps += 1
+
+    def predict(self, keys: List[tuple]) -> np.ndarray:
+        """Predicción para claves (year, country, type) futuras (ver covers)."""
+        until: Dict[tuple, int] = {}
+        for k in keys:
+            g = tuple(k[1:1 + len(self.group_cols)])
+            until[g] = max(until.get(g, -1), int(k[0]))
+        with self._lock:
+            self._advance(list(until), until)
+            return np.array([self.paths[tuple(k[1:1 + len(self.group_cols)])][int(k[0])] for k in keys])
+
+Query = Tuple[str, str, int]
+
+def _normalize_queries(queries: Union[pd.DataFrame, Iterable[Query]]) -> pd.DataFrame:
+    if isinstance(queries, pd.DataFrame):
+        q = ensure_basic_cols(queries)
+        missing = [c for c in BASE_COLS if c not in q.columns]
+        if missing:
+            raise ValueError(f"Faltan columnas en queries: {missing}")
+        q = q[["country", "type", "year"]]
+    else:
+        q = pd.DataFrame(list(queries), columns=["country", "type", "year"])
+    q = q.reset_index(drop=True)
+    q["year"] = q["year"].astype(int)
+    q["country"] = q["country"].astype(str)
+    q["type"] = q["type"].astype(str)
+    return q
+
+def _new_rows(df_all: pd.DataFrame, keys: List[tuple], group_cols: list) -> pd.DataFrame:
+    base_cols = ["year"] + [c for c in group_cols if c in df_all.columns]
+    new_rows = pd.DataFrame({c: [None] * len(keys) for c in df_all.columns})
+    for c in base_cols:
+        j = {"year": 0, "country": 1, "type": 2}.get(c)
+        if j is not None:
+            new_rows[c] = [k[j] for k in keys]
+    return new_rows
+
+@traced("inference.predict_many")
+def predict_many(df_all: pd.DataFrame, artifact_path: str,
+                 queries: Union[pd.DataFrame, Iterable[Query]],
+                 index: Optional[GroupIndex] = None) -> pd.DataFrame:
+    """
+    Predicción vectorizada para muchas tuplas (country, type, year).
+    Construye features una sola vez, agrega de una vez las filas objetivo faltantes
+    y llama a `predict` una sola vez. Columnas de salida como en
+    predicciones/predicciones_insample.csv: year, country, type, pred_<y>, pred_<y>_lo80, ...
+    Si se pasa `index` (ver load_context), df_all debe ser el frame con el que se construyó.
+    """
+    if not os.path.exists(artifact_path):
+        raise FileNotFoundError(f"No encuentro el artifact: {artifact_path}")
+
+    mdl, y_col, feat_cols, group_cols, q80, q95, art = load_artifact_info(artifact_path)
+    if index is None or index.n_rows != len(df_all):
+        df_all = ensure_basic_cols(df_all)
+        index = GroupIndex(df_all)
+    with span("inference.lookup"):
+        q = _normalize_queries(queries)
+
+        # Normaliza valores (case-insensitive) con las tablas del índice
+        q["country"] = [index.normalize("country", v) for v in q["country"]]
+        q["type"] = [index.normalize("type", v) for v in q["type"]]
+
+        q_keys = list(zip(q["year"].tolist(), q["country"].tolist(), q["type"].tolist()))
+        found = {k: index.locate(*k) for k in dict.fromkeys(q_keys)}
+        missing = [k for k, lab in found.items() if lab is None]
+    count("inference.queries", len(q_keys))
+    count("inference.rows_missing", len(missing))
+
+    mode = _feature_mode(mdl, y_col, feat_cols, art)
+    found_keys = [k for k, lab in found.items() if lab is not None]
+    direct: Dict[tuple, float] = {}
+    with span("inference.features"):
+        if mode == "build_xy":
+            # Features del dataset calculadas una vez por versión (memo del índice) +
+            # solo las filas nuevas de forma incremental
+            from utils.features import build_xy, build_xy_increment, make_codebook
+            lag_cols = art.get("lag_cols")
+            codebook = art.get("codebook") or index.memo(("codebook",), lambda: make_codebook(df_all))
+            X_base = index.memo(("build_xy", y_col, repr(lag_cols), repr(codebook)),
+                                lambda: build_xy(df_all, y_col, lag_cols, codebook=codebook)[0])
+            if missing:
+                # Años futuros de grupos conocidos: recursivo, con estado cacheado por artifact
+                fc = index.memo(("forecaster", file_signature(artifact_path)),
+                                lambda: RecursiveForecaster(df_all, mdl, y_col, feat_cols, lag_cols, codebook, group_cols))
+                future = [k for k in missing if fc.covers(k)]
+                if future:
+                    with span("inference.recursive"):
+                        direct = dict(zip(future, fc.predict(future).tolist()))
+                    missing = [k for k in missing if k not in direct]
+            parts = [X_base.loc[[found[k] for k in found_keys]]]
+            if missing:
+                new = ensure_basic_cols(_new_rows(df_all, missing, group_cols))
+                parts.append(build_xy_increment(df_all, new, y_col, lag_cols, codebook=codebook))
+            X_all = pd.concat(parts, ignore_index=True)[feat_cols]
+            row_pos = dict(zip(found_keys + missing, X_all.index))
+            row_index = X_all.index
+        elif mode == "local":
+            # Features fila a fila: basta con construirlas sobre las filas pedidas
+            parts = [df_all.loc[[found[k] for k in found_keys]]]
+            if missing:
+                parts.append(_new_rows(df_all, missing, group_cols))
+            df_rows = ensure_basic_cols(pd.concat(parts, ignore_index=True))
+            row_pos = dict(zip(found_keys + missing, df_rows.index))
+            X_all = _build_feature_matrix(df_rows, mdl, y_col, feat_cols, try_build_xy=False,
+                                          encoder=art.get("encoder"))
+            row_index = df_rows.index
+        else:
+            row_pos = {k: found[k] for k in found_keys}
+            if missing:
+                # Agrega todas las filas objetivo faltantes en un solo paso
+                df_all = ensure_basic_cols(pd.concat([df_all, _new_rows(df_all, missing, group_cols)], ignore_index=True))
+                start = len(df_all) - len(missing)
+                for i, k in enumerate(missing):
+                    row_pos[k] = df_all.index[start + i]
+            X_all = _build_feature_matrix(df_all, mdl, y_col, feat_cols, encoder=art.get("encoder"))
+            row_index = X_all.index if isinstance(X_all, pd.DataFrame) else df_all.index
+
+    via_x = np.array([k not in direct for k in q_keys], dtype=bool)
+    y_hat = np.empty(len(q_keys), dtype=float)
+    if via_x.any():
+        pos = row_index.get_indexer([row_pos[k] for k, v in zip(q_keys, via_x) if v])
+        if (pos < 0).any():
+            raise RuntimeError("No pude ubicar la fila objetivo tras construir features.")
+        X_pred = X_all.iloc[pos] if isinstance(X_all, pd.DataFrame) else X_all[pos]
+        with span("inference.predict"):
+            y_hat[via_x] = _predict(mdl, X_pred)
+    if direct:
+        y_hat[~via_x] = [direct[k] for k, v in zip(q_keys, via_x) if not v]
+    out = q[["year", "country", "type"]].copy()
+    out[f"pred_{y_col}"] = y_hat
+    if q80 is not None:
+        out[f"pred_{y_col}_lo80"] = y_hat - float(q80)
+        out[f"pred_{y_col}_hi80"] = y_hat + float(q80)
+    if q95 is not None:
+        out[f"pred_{y_col}_lo95"] = y_hat - float(q95)
+        out[f"pred_{y_col}_hi95"] = y_hat + float(q95)
+    return out
+
+def predict_with_artifact(df_all: pd.DataFrame, artifact_path: str, year: int, country: str, ctype: str,
+                          index: Optional[GroupIndex] = None) -> Dict:
+    res = predict_many(df_all, artifact_path, [(country, ctype, int(year))], index=index)
+    row = res.iloc[0]
+    y_col = res.columns[3][len("pred_"):]
+    out = {"pred": float(row[f"pred_{y_col}"]),
+           "group": {"country": str(row["country"]), "type": str(row["type"]), "year": int(row["year"])}}
+    for b in ("lo80", "hi80", "lo95", "hi95"):
+        c = f"pred_{y_col}_{b}"
+        if c in res.columns:
+            out[b] = float(row[c])
+    return out
@@ -0,0 +1,115 @@
+# utils/kpis.py
+# ------------------------------------------------------------
+# Motor de KPIs por grupo (country, type) y escenarios de costos
+# - revenue, profit, margin, market_share y CAGR para todos los grupos
+# - Muchos escenarios (fixed_cost × variable_cost_per_unit) a la vez por broadcasting
+# - Solo lee columnas del DataFrame base (no lo copia ni lo modifica)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+from typing import Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.io import FIXED_COST, VAR_COST_PER_CUP
+from utils.metrics import cagr
+
+GROUP_COLS = ("country", "type")
+
+def scenario_grid(fixed_costs=FIXED_COST, variable_costs=VAR_COST_PER_CUP, product: bool = True) -> pd.DataFrame:
+    """
+    Escenarios de costos. product=True: todas las combinaciones;
+    product=False: vectores emparejados (mismo largo o escalares).
+    """
+    fc = np.atleast_1d(np.asarray(fixed_costs, dtype=float))
+    vc = np.atleast_1d(np.asarray(variable_costs, dtype=float))
+    if product:
+        fc, vc = (a.ravel() for a in np.meshgrid(fc, vc, indexing="ij"))
+    else:
+        fc, vc = np.broadcast_arrays(fc, vc)
+    return pd.DataFrame({"fixed_cost": fc, "variable_cost_per_unit": vc})
+
+def _group_codes(df: pd.DataFrame, by: Sequence[str]) -> Tuple[np.ndarray, pd.DataFrame]:
+    codes, keys = pd.MultiIndex.from_frame(df[list(by)].astype(str)).factorize(sort=True)
+    return codes, keys.to_frame(index=False, name=list(by))
+
+def _first_last(codes: np.ndarray, year: np.ndarray, n_groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Posición de la fila del primer y del último año de cada grupo (empates: la primera, como idxmin/idxmax)."""
+    pos = np.arange(len(year))
+    groups = np.arange(n_groups)
+    asc = np.lexsort((pos, year, codes))
+    desc = np.lexsort((-pos, year, codes))
+    first = asc[np.searchsorted(codes[asc], groups, side="left")]
+    last = desc[np.searchsorted(codes[desc], groups, side="right") - 1]
+    return first, last
+
+def group_cagr(df: pd.DataFrame, value_col: str, by: Sequence[str] | str = GROUP_COLS,
+               year_col: str = "year", periods=None) -> pd.DataFrame:
+    """
+    CAGR de `value_col` entre el primer y el último año de cada grupo, sin loop por grupo.
+    periods=None usa el rango de años de cada grupo; un número fija el mismo para todos.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    codes, keys = _group_codes(df, by)
+    year = pd.to_numeric(df[year_col], errors="coerce").to_numpy(dtype=float)
+    values = pd.to_numeric(df[value_col], errors="coerce").to_numpy(dtype=float)
+    first, last = _first_last(codes, year, len(keys))
+    span = year[last] - year[first] if periods is None else periods
+    keys[f"cagr_{value_col}"] = cagr(values[first], values[last], span)
+    return keys
+
+def group_kpis(df: pd.DataFrame, fixed_costs=FIXED_COST, variable_costs=VAR_COST_PER_CUP,
+               by: Sequence[str] = GROUP_COLS, product: bool = True) -> pd.DataFrame:
+    """
+    KPIs totales por grupo para cada escenario de costos (formato largo: escenario × grupo).
+    Igual que sumar por grupo las columnas de add_kpis en cada escenario:
+    el costo fijo se reparte por año y cada fila con ingreso válido paga su parte.
+    - revenue, consumption y market_share (participación en el consumo total) no dependen del costo.
+    - profit, margin y cagr_profit se calculan como matrices (escenarios × grupos).
+    """
+    by = list(by)
+    scen = scenario_grid(fixed_costs, variable_costs, product)
+    codes, keys = _group_codes(df, by)
+    n_groups = len(keys)
+    year = pd.to_numeric(df["year"], errors="coerce").to_numpy(dtype=float)
+    cons = pd.to_numeric(df["consumption"], errors="coerce").to_numpy(dtype=float)
+    price = pd.to_numeric(df["price"], errors="coerce").to_numpy(dtype=float)
+    revenue = price * cons
+    valid = ~np.isnan(revenue)
+
+    # Sumas por grupo (solo filas con ingreso válido, como groupby().sum() de profit)
+    def gsum(w):
+        return np.bincount(codes[valid], weights=w[valid], minlength=n_groups)
+    rev_g, cons_g = gsum(revenue), gsum(cons)
+    rows_g = np.bincount(codes[valid], minlength=n_groups).astype(float)
+    cons_all = np.bincount(codes, weights=np.nan_to_num(cons), minlength=n_groups)
+
+    fixed_per_year = scen["fixed_cost"].to_numpy() / np.unique(year[~np.isnan(year)]).size
+    vc = scen["variable_cost_per_unit"].to_numpy()
+    profit_g = rev_g[None, :] - fixed_per_year[:, None] * rows_g[None, :] - vc[:, None] * cons_g[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        margin_g = np.where(rev_g != 0, profit_g / rev_g, np.nan)
+
+    first, last = _first_last(codes, year, n_groups)
+    span = year[last] - year[first]
+    p_first = revenue[first][None, :] - fixed_per_year[:, None] - vc[:, None] * cons[first][None, :]
+    p_last = revenue[last][None, :] - fixed_per_year[:, None] - vc[:, None] * cons[last][None, :]
+
+    n_scen = len(scen)
+    out = pd.DataFrame({
+        "scenario": np.repeat(np.arange(n_scen), n_groups),
+        "fixed_cost": np.repeat(scen["fixed_cost"].to_numpy(), n_groups),
+        "variable_cost_per_unit": np.repeat(vc, n_groups),
+    })
+    for c in by:
+        out[c] = np.tile(keys[c].to_numpy(), n_scen)
+    total = cons_all.sum()
+    out["consumption"] = np.tile(cons_all, n_scen)
+    out["revenue"] = np.tile(rev_g, n_scen)
+    out["profit"] = profit_g.ravel()
+    out["margin"] = margin_g.ravel()
+    out["market_share"] = np.tile(cons_all / total if total else np.full(n_groups, np.nan), n_scen)
+    out["cagr_consumption"] = np.tile(cagr(cons[first], cons[last], span), n_scen)
+    out["cagr_profit"] = cagr(p_first, p_last, span[None, :]).ravel()
+    return out
@@ -1,8 +1,11 @@
 from __future__ import annotations
-import numpy as np
-import pandas as pd
 from dataclasses import dataclass
 
+from utils._lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
 def profit(consumption, price, fixed_cost=0.0, variable_cost_per_unit=0.0):
     consumption = np.asarray(consumption, dtype=float)
     price = np.asarray(price, dtype=float)
@@ -16,15 +19,22 @@ def margin(consumption, price, fixed_cost=0.0, variable_cost_per_unit=0.0):
     return m
 
 def cagr(first_value, last_value, periods):
-    first_value = float(first_value)
-    last_value = float(last_value)
-    periods = int(periods)
-    if periods <= 0 or first_value <= 0 or last_value <= 0:
-        return np.nan
-    return (last_value / first_value) ** (1.0 / periods) - 1.0
+    """Escalar o vectorizado (arrays con broadcasting); NaN si algún valor no es positivo o periods no es finito."""
+    first_value = np.asarray(first_value, dtype=float)
+    last_value = np.asarray(last_value, dtype=float)
+    periods = np.asarray(periods, dtype=float)
+    ok = np.isfinite(periods) & (periods > 0) & (first_value > 0) & (last_value > 0)
+    # Se trunca a entero solo donde es finito (NaN/inf castean a basura)
+    periods = np.where(ok, periods, 1.0).astype(int)
+    ok &= periods > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(ok, (last_value / first_value) ** (1.0 / np.where(ok, periods, 1)) - 1.0, np.nan)
+    return float(out) if out.ndim == 0 else out
 
-def market_share(df: pd.DataFrame, value_col: str, group_cols=("year",)):
-    df = df.copy()
+def market_share(df: pd.DataFrame, value_col: str, group_cols=("year",), copy: bool = True):
+    """Columna market_share; con copy=False escribe en df sin copiar el DataFrame."""
+    if copy:
+        df = df.copy()
     total = df.groupby(list(group_cols))[value_col].transform("sum")
     with np.errstate(divide="ignore", invalid="ignore"):
         df["market_share"] = np.where(total != 0, df[value_col] / total, np.nan)
@@ -50,20 +60,34 @@ def r2(y_true, y_pred):
     return 1 - ss_res/ss_tot
 
 def mape(y_true, y_pred):
+    """Ignora las posiciones con y_true == 0 (APE indefinido)."""
     y_true = np.asarray(y_true, dtype=float)
     y_pred = np.asarray(y_pred, dtype=float)
-    with np.errstate(divide="ignore", invalid="ignore"):
-        out = np.abs((y_true - y_pred) / y_true) * 100.0
-    out = out[~np.isinf(out)]
-    return np.mean(out)
+    nz = y_true != 0
+    return np.mean(np.abs((y_true[nz] - y_pred[nz]) / y_true[nz])) * 100.0 if nz.any() else np.nan
 
 def smape(y_true, y_pred):
+    """Denominador con piso 1e-9: un 0 pronosticado como 0 cuenta como error 0 (no se descarta)."""
     y_true = np.asarray(y_true, dtype=float)
     y_pred = np.asarray(y_pred, dtype=float)
     denom = (np.abs(y_true) + np.abs(y_pred)) / 2.0
-    with np.errstate(divide="ignore", invalid="ignore"):
-        out = np.where(denom != 0, np.abs(y_pred - y_true) / denom, np.nan) * 100.0
-    return np.nanmean(out)
+    return np.mean(np.abs(y_pred - y_true) / np.where(denom == 0, 1e-9, denom)) * 100.0
+
+def mdape(y_true, y_pred):
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    denom = np.where(y_true == 0, 1e-9, np.abs(y_true))
+    return np.median(np.abs((y_true - y_pred) / denom)) * 100.0
+
+def mase(y_true, y_pred, y_train, m=1):
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    y_train = np.asarray(y_train, dtype=float)
+    if len(y_train) <= m:
+        return np.nan
+    denom = np.mean(np.abs(y_train[m:] - y_train[:-m]))
+    denom = denom if denom != 0 else 1e-9
+    return np.mean(np.abs(y_true - y_pred)) / denom
 
 @dataclass
 class RegressionReport:
@@ -81,3 +105,91 @@ def regression_report(y_true, y_pred) -> RegressionReport:
         smape=smape(y_true, y_pred),
         r2=r2(y_true, y_pred),
     )
+
+BATCH_METRICS = ["RMSE", "MAE", "MAPE(%)", "sMAPE(%)", "MdAPE(%)", "MASE", "R2", "n"]
+
+def mase_scale(y_train, m=1):
+    """
+    Denominador de MASE por fila: media de |y_t - y_{t-m}| del entrenamiento.
+    y_train 1-D o 2-D (filas rellenas con NaN al final).
+    """
+    y_train = np.atleast_2d(np.asarray(y_train, dtype=float))
+    d = np.abs(y_train[:, m:] - y_train[:, :-m])
+    ok = ~np.isnan(d)
+    cnt = ok.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where(ok, d, 0.0).sum(axis=1) / cnt
+    scale[cnt == 0] = np.nan
+    return np.where(scale == 0, 1e-9, scale)
+
+def regression_report_batch(y_true, y_pred, y_train=None, scale=None, m=1, labels=None) -> pd.DataFrame:
+    """
+    Todas las métricas de una vez para k series (modelos/folds/targets).
+    - y_pred: (k, n); y_true: (k, n) o (n,) compartido. Los NaN de y_true marcan
+      posiciones vacías (folds de distinto tamaño van rellenos con NaN).
+    - MASE: `scale` (k,) ya calculado o `y_train` (k, t) para calcularlo con mase_scale.
+    - labels: DataFrame/dict/lista con k filas que se antepone al resultado.
+    Mismas definiciones que las funciones escalares sobre las posiciones válidas:
+    MAPE ignora y_true == 0 y sMAPE cuenta 0 vs 0 como error 0.
+    """
+    y_pred = np.atleast_2d(np.asarray(y_pred, dtype=float))
+    y_true = np.broadcast_to(np.asarray(y_true, dtype=float), y_pred.shape)
+    valid = ~np.isnan(y_true)
+    n = valid.sum(axis=1)
+    err = np.where(valid, y_pred - y_true, 0.0)
+    abs_err = np.abs(err)
+    abs_true = np.abs(y_true)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mae_ = abs_err.sum(axis=1) / n
+        rmse_ = np.sqrt(np.einsum("ij,ij->i", err, err) / n)
+
+        # Un solo APE: denominador 1e-9 en y_true == 0 (como mdape); MAPE excluye esas posiciones
+        nz = valid & (y_true != 0)
+        ape = abs_err / np.where(y_true == 0, 1e-9, abs_true)
+        mape_ = np.where(nz, ape, 0.0).sum(axis=1) / nz.sum(axis=1) * 100.0
+        ape[~valid] = np.nan
+        mdape_ = np.nanmedian(ape, axis=1) * 100.0 if ape.shape[1] else np.full(len(n), np.nan)
+
+        # Mismo piso que smape: 0 vs 0 cuenta como error 0 dentro de las n posiciones
+        den = (abs_true + np.abs(y_pred)) / 2.0
+        spe = abs_err / np.where(den == 0, 1e-9, den)
+        smape_ = np.where(valid, spe, 0.0).sum(axis=1) / n * 100.0
+
+        mean_true = np.where(valid, y_true, 0.0).sum(axis=1) / n
+        dev = np.where(valid, y_true - mean_true[:, None], 0.0)
+        ss_tot = np.einsum("ij,ij->i", dev, dev)
+        r2_ = 1.0 - np.einsum("ij,ij->i", err, err) / ss_tot
+    r2_[ss_tot == 0] = np.nan
+
+    if scale is None and y_train is not None:
+        scale = mase_scale(y_train, m)
+    mase_ = mae_ / np.asarray(scale, dtype=float) if scale is not None else np.full(len(n), np.nan)
+
+    out = pd.DataFrame({"RMSE": rmse_, "MAE": mae_, "MAPE(%)": mape_, "sMAPE(%)": smape_,
+                        "MdAPE(%)": mdape_, "MASE": mase_, "R2": r2_, "n": n})
+    if labels is not None:
+        labels = pd.DataFrame(labels).reset_index(drop=True)
+        out = pd.concat([labels, out], axis=1)
+    return out
+
+def regression_report_groups(df: pd.DataFrame, by, true_col: str = "y_true", pred_col: str = "y_pred",
+                             scale_col: str | None = None) -> pd.DataFrame:
+    """
+    regression_report_batch sobre un DataFrame largo (una fila por observación):
+    cada grupo de `by` (p. ej. target, model, fold) se vuelve una fila de la matriz.
+    `scale_col` (constante por grupo) es el denominador de MASE.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    codes, keys = pd.MultiIndex.from_frame(df[by]).factorize()
+    pos = pd.Series(codes).groupby(codes).cumcount().to_numpy()
+    k, width = len(keys), (int(pos.max()) + 1 if len(pos) else 0)
+    y_true = np.full((k, width), np.nan)
+    y_pred = np.full((k, width), np.nan)
+    y_true[codes, pos] = df[true_col].to_numpy(dtype=float)
+    y_pred[codes, pos] = df[pred_col].to_numpy(dtype=float)
+    scale = None
+    if scale_col is not None:
+        scale = np.full(k, np.nan)
+        scale[codes] = df[scale_col].to_numpy(dtype=float)
+    return regression_report_batch(y_true, y_pred, scale=scale, labels=keys.to_frame(index=False, name=by))
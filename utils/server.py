@@ -0,0 +1,225 @@
+# utils/server.py
+# ------------------------------------------------------------
+# Servicio de predicción independiente de Streamlit (solo stdlib + utils)
+# - Artifacts y dataset precargados al arrancar (caché de proceso)
+# - POST /predict (una tupla, desde el cubo de utils.cube si está al día) y
+#   POST /predict/batch (muchas, una llamada a predict_many)
+# - GET /health y GET /metrics (latencias p50/p90/p99 por endpoint + etapas de utils.tracing)
+# - GET /metrics/prometheus (texto de Prometheus; etapas con --trace o COFFEE_TRACING=1)
+# Ejecuta: python -m utils.server --port 8000
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, List, Optional
+
+import numpy as np
+
+from utils.cache import cache_stats, warm_up
+from utils.cube import current_cube, predict_cached
+from utils.inference import load_context, predict_many, predict_with_artifact
+from utils import tracing
+
+# Nombres que usa la app (/pred precio|consumo|utilidad) → target del artifact
+TARGET_ALIASES = {"precio": "price", "consumo": "consumption", "utilidad": "profit"}
+LATENCY_WINDOW = 10_000
+
+class PayloadError(ValueError):
+    """Petición mal formada (HTTP 400); cualquier otro error de predicción es un 500."""
+
+def _field(obj, name: str):
+    if not isinstance(obj, dict):
+        raise PayloadError(f"se esperaba un objeto JSON, llegó {type(obj).__name__}")
+    if name not in obj:
+        raise PayloadError(f"falta el campo '{name}'")
+    return obj[name]
+
+def _query(q) -> tuple:
+    """(country, type, year) validado de un objeto {'country', 'type', 'year'}."""
+    country, ctype, year = _field(q, "country"), _field(q, "type"), _field(q, "year")
+    for name, v in (("country", country), ("type", ctype)):
+        if not isinstance(v, str) or not v.strip():
+            raise PayloadError(f"'{name}' debe ser un texto no vacío")
+    try:
+        if isinstance(year, bool) or float(year) != int(float(year)):
+            raise ValueError
+        year = int(float(year))
+    except (TypeError, ValueError):
+        raise PayloadError(f"'year' debe ser un año entero, llegó {year!r}") from None
+    return country, ctype, year
+
+class LatencyStats:
+    """Últimas `window` latencias por endpoint (en segundos) con percentiles."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            snap = {k: np.fromiter(v, dtype=float) for k, v in self._samples.items()}
+            counts = dict(self._counts)
+        out = {}
+        for k, s in snap.items():
+            p50, p90, p99 = np.percentile(s, [50, 90, 99]) * 1000.0 if len(s) else (np.nan,) * 3
+            out[k] = {"count": counts[k], "mean_ms": float(s.mean() * 1000.0) if len(s) else float("nan"),
+                      "p50_ms": float(p50), "p90_ms": float(p90), "p99_ms": float(p99)}
+        return out
+
+class PredictionService:
+    """Lógica del servicio (sin HTTP), reutilizable desde tests o jobs."""
+
+    def __init__(self, data_path: str, artifacts: Dict[str, str], use_cube: bool = True):
+        self.data_path = data_path
+        self.artifacts = {k: v for k, v in artifacts.items() if v}
+        self.use_cube = use_cube
+        self.latency = LatencyStats()
+
+    def warm_up(self) -> Dict[str, bool]:
+        loaded = warm_up(self.artifacts.values(), [self.data_path])
+        if os.path.exists(self.data_path):
+            load_context(self.data_path)
+            if self.use_cube:
+                # Agenda en segundo plano los cubos que falten para esta versión de los archivos
+                for art in self.artifacts.values():
+                    if os.path.exists(art):
+                        current_cube(self.data_path, art)
+        return loaded
+
+    def artifact_for(self, target: str) -> str:
+        t = TARGET_ALIASES.get(str(target).lower(), str(target).lower())
+        if t not in self.artifacts:
+            raise PayloadError(f"Target desconocido: {target} (disponibles: {sorted(self.artifacts)})")
+        return self.artifacts[t]
+
+    def predict(self, payload: Dict) -> Dict:
+        art = self.artifact_for(_field(payload, "target"))
+        country, ctype, year = _query(payload)
+        df, index = load_context(self.data_path)
+        if self.use_cube:
+            return predict_cached(df, self.data_path, art, year, country, ctype, index=index)
+        return predict_with_artifact(df, art, year, country, ctype, index=index)
+
+    def predict_batch(self, payload: Dict) -> Dict:
+        """{'target': 'price', 'queries': [{'country', 'type', 'year'}, ...]}"""
+        art = self.artifact_for(_field(payload, "target"))
+        queries = _field(payload, "queries")
+        if not isinstance(queries, list):
+            raise PayloadError("'queries' debe ser una lista")
+        queries = [_query(q) for q in queries]
+        df, index = load_context(self.data_path)
+        res = predict_many(df, art, queries, index=index)
+        return {"target": payload["target"], "predictions": json.loads(res.to_json(orient="records"))}
+
+    def health(self) -> Dict:
+        return {"status": "ok", "data": self.data_path,
+                "artifacts": {k: os.path.exists(v) for k, v in self.artifacts.items()},
+                "cache": cache_stats()}
+
+def make_handler(service: PredictionService, verbose: bool = False):
+    routes_post = {"/predict": service.predict, "/predict/batch": service.predict_batch}
+    routes_get = {"/health": service.health,
+                  "/metrics": lambda: {"latency": service.latency.report(), "tracing": tracing.snapshot()}}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, body: Dict, content_type: str = "application/json; charset=utf-8") -> None:
+            if isinstance(body, str):
+                data = body.encode("utf-8")
+            else:
+                data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _handle(self, fn, payload=None) -> None:
+            t0 = time.perf_counter()
+            try:
+                body, status = (fn(payload) if payload is not None else fn()), 200
+            except PayloadError as e:
+                body, status = {"error": f"Petición inválida: {e}"}, 400
+            except FileNotFoundError as e:
+                body, status = {"error": str(e)}, 404
+            except Exception as e:
+                body, status = {"error": f"{type(e).__name__}: {e}"}, 500
+            self._send(status, body)
+            service.latency.record(f"{self.command} {self.path}", time.perf_counter() - t0)
+
+        def do_GET(self):
+            if self.path == "/metrics/prometheus":
+                return self._send(200, tracing.to_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+            fn = routes_get.get(self.path)
+            if fn is None:
+                return self._send(404, {"error": f"Ruta desconocida: {self.path}"})
+            self._handle(fn)
+
+        def do_POST(self):
+            fn = routes_post.get(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            if fn is None:
+                return self._send(404, {"error": f"Ruta desconocida: {self.path}"})
+            try:
+                payload = json.loads(raw or b"{}")
+            except json.JSONDecodeError as e:
+                return self._send(400, {"error": f"JSON inválido: {e}"})
+            self._handle(fn, payload)
+
+        def log_message(self, fmt, *args):
+            if verbose:
+                super().log_message(fmt, *args)
+
+    return Handler
+
+def make_server(service: PredictionService, host: str = "127.0.0.1", port: int = 8000,
+                verbose: bool = False) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_handler(service, verbose))
+    server.daemon_threads = True
+    return server
+
+def main(argv: Optional[List[str]] = None) -> None:
+    default_clean = "data/coffee_clean.parquet" if os.path.exists("data/coffee_clean.parquet") else "data/coffee_clean.csv"
+    ap = argparse.ArgumentParser(description="Servicio HTTP de predicción (Coffee)")
+    ap.add_argument("--data", default=os.getenv("DATA_CLEAN", default_clean))
+    ap.add_argument("--art-price", default=os.getenv("ART_PRICE", "models/price_model.joblib"))
+    ap.add_argument("--art-consumption", default=os.getenv("ART_CONSUMPTION", "models/consumption_model.joblib"))
+    ap.add_argument("--art-profit", default=os.getenv("ART_PROFIT", "models/profit_model.joblib"))
+    ap.add_argument("--host", default=os.getenv("PRED_HOST", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("PRED_PORT", "8000")))
+    ap.add_argument("--verbose", action="store_true", help="log de cada petición")
+    ap.add_argument("--trace", action="store_true", help="mide etapas del pipeline (utils.tracing)")
+    ap.add_argument("--no-cube", action="store_true", help="no usar el cubo precalculado (utils.cube)")
+    args = ap.parse_args(argv)
+    if args.trace:
+        tracing.enable()
+
+    service = PredictionService(args.data, {"price": args.art_price, "consumption": args.art_consumption,
+                                            "profit": args.art_profit}, use_cube=not args.no_cube)
+    print("Precarga:", service.warm_up())
+    server = make_server(service, args.host, args.port, args.verbose)
+    print(f"☕ Sirviendo predicciones en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
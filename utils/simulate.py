@@ -0,0 +1,182 @@
+# utils/simulate.py
+# ------------------------------------------------------------
+# Simulación Monte Carlo (what-if) de precio, consumo y utilidad
+# - Trayectorias por (country, type) en un horizonte de varios años
+# - Ruido escalado por la predicción de cada grupo (un país chico no recibe el ruido de Brasil):
+#   residuales log de validación ('resid_val_log': log1p(y) - log1p(pred), el espacio en que
+#   se entrenan price/consumption); si no existen, residuales absolutos ('resid_val' o sigma
+#   de PI95_abs/PI80_abs) pasados a fracción del nivel medio del target
+# - Choques independientes por año (persistence=0) o AR(1) a lo largo del horizonte
+#   (persistence=rho); el choque no se propaga por los rezagos del modelo
+# - Vectorizado sobre grupos × trayectorias × años, en bloques de grupos (memoria acotada)
+# - Reproducible: un stream de números aleatorios por grupo (no depende del tamaño de bloque)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import load_artifact
+from utils.inference import GroupIndex, ensure_basic_cols, predict_many
+from utils.io import FIXED_COST, VAR_COST_PER_CUP
+
+Z80, Z95 = 1.2815515655446004, 1.959963984540054
+QUANTILES = (0.05, 0.5, 0.95)
+
+@dataclass
+class SimulationResult:
+    summary: pd.DataFrame                       # una fila por (country, type, year)
+    paths: Optional[Dict[str, np.ndarray]] = None  # (grupos, n_paths, años) si keep_paths=True
+
+@dataclass
+class Noise:
+    """Residuales remuestreados (o normal con `sigma`) en escala log o relativa a la predicción."""
+    pool: Optional[np.ndarray]
+    sigma: float
+    log: bool  # True: log1p(y) - log1p(pred); False: (y - pred) / pred
+
+def _clean(values) -> Optional[np.ndarray]:
+    if values is None:
+        return None
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    return values if len(values) else None
+
+def residual_pool(art, level: Optional[float] = None) -> Noise:
+    """
+    Ruido del artifact. Preferencia: 'resid_val_log' (utils.train); si no, 'resid_val' o la
+    sigma de las bandas PI divididos por `level` (nivel medio del target) → fracción de la predicción.
+    """
+    art = art if isinstance(art, dict) else {}
+    pool = _clean(art.get("resid_val_log"))
+    if pool is not None:
+        return Noise(pool, 0.0, log=True)
+    scale = 1.0 / level if level else 0.0
+    pool = _clean(art.get("resid_val"))
+    if art.get("PI95_abs") is not None:
+        sigma = float(art["PI95_abs"]) / Z95
+    elif art.get("PI80_abs") is not None:
+        sigma = float(art["PI80_abs"]) / Z80
+    else:
+        sigma = 0.0
+    return Noise(pool * scale if pool is not None else None, sigma * scale, log=False)
+
+def _draw(rng: np.random.Generator, noise: Noise, shape, persistence: float = 0.0) -> np.ndarray:
+    """Choques (n_paths, años); con persistence=rho, AR(1) con la misma varianza marginal."""
+    if noise.pool is not None:
+        out = noise.pool[rng.integers(0, len(noise.pool), size=shape)]
+    elif noise.sigma > 0:
+        out = rng.normal(0.0, noise.sigma, size=shape)
+    else:
+        return np.zeros(shape)
+    if persistence:
+        w = np.sqrt(1.0 - persistence ** 2)
+        for j in range(1, shape[-1]):
+            out[..., j] = persistence * out[..., j - 1] + w * out[..., j]
+    return out
+
+def _apply(hat: np.ndarray, shocks: np.ndarray, noise: Noise) -> np.ndarray:
+    """Predicción (grupos, 1, años) + choques → trayectorias >= 0 en la escala del grupo."""
+    if noise.log:
+        return np.clip(np.expm1(np.log1p(np.clip(hat, 0, None)) + shocks), 0, None)
+    return np.clip(hat * (1.0 + shocks), 0, None)
+
+def _level(df: pd.DataFrame, art) -> Optional[float]:
+    """Nivel medio |y| del target en el dataset (escala de los residuales absolutos)."""
+    y_col = art.get("y_col") if isinstance(art, dict) else None
+    if y_col not in df.columns:
+        return None
+    level = float(np.nanmean(np.abs(pd.to_numeric(df[y_col], errors="coerce"))))
+    return level if level > 0 else None
+
+def point_forecasts(df: pd.DataFrame, artifact_path: str, groups: Sequence[Tuple[str, str]],
+                    years: Sequence[int], index: Optional[GroupIndex] = None) -> np.ndarray:
+    """Predicción puntual (grupos × años) con una sola llamada a predict_many."""
+    queries = [(c, t, int(y)) for c, t in groups for y in years]
+    res = predict_many(df, artifact_path, queries, index=index)
+    return res.iloc[:, 3].to_numpy(dtype=float).reshape(len(groups), len(years))
+
+def _summarize(name: str, values: np.ndarray, quantiles: Sequence[float]) -> Dict[str, np.ndarray]:
+    """values: (grupos, n_paths, años) → {columna: (grupos, años)}."""
+    out = {f"{name}_mean": values.mean(axis=1)}
+    qs = np.quantile(values, quantiles, axis=1)
+    for q, arr in zip(quantiles, qs):
+        out[f"{name}_p{int(round(q * 100)):02d}"] = arr
+    return out
+
+def simulate(df: pd.DataFrame, price_artifact: str, consumption_artifact: str,
+             years: Iterable[int], groups: Optional[Sequence[Tuple[str, str]]] = None,
+             n_paths: int = 1000, seed: int = 0, chunk_size: Optional[int] = None,
+             fixed_cost: float = FIXED_COST, variable_cost_per_unit: float = VAR_COST_PER_CUP,
+             quantiles: Sequence[float] = QUANTILES, keep_paths: bool = False,
+             index: Optional[GroupIndex] = None, max_bytes: int = 256 << 20,
+             persistence: float = 0.0) -> SimulationResult:
+    """
+    N trayectorias de precio y consumo por grupo y año: predicción puntual con un residual
+    remuestreado, escalado por la predicción del grupo (log o relativo, ver residual_pool) y
+    recortado a >= 0. La utilidad se deriva como en add_kpis (costo fijo repartido por los
+    años del dataset).
+    persistence: 0 = choques independientes por año; rho en (0, 1) = AR(1) por trayectoria
+    (un mal año tiende a seguir malo). El choque no realimenta los rezagos del modelo: la
+    trayectoria central es el pronóstico recursivo puntual.
+    chunk_size: grupos por bloque (por defecto, los que caben en `max_bytes`).
+    keep_paths=True guarda las trayectorias completas (sin tope de memoria).
+    """
+    if not 0.0 <= persistence < 1.0:
+        raise ValueError("persistence debe estar en [0, 1)")
+    df = ensure_basic_cols(df) if index is None else df
+    years = [int(y) for y in years]
+    if groups is None:
+        groups = list(df[["country", "type"]].drop_duplicates().sort_values(["country", "type"])
+                      .itertuples(index=False, name=None))
+    elif index is not None:
+        groups = [(index.normalize("country", c), index.normalize("type", t)) for c, t in groups]
+    groups = [(str(c), str(t)) for c, t in groups]
+    n_groups, n_years = len(groups), len(years)
+
+    price_hat = point_forecasts(df, price_artifact, groups, years, index)
+    cons_hat = point_forecasts(df, consumption_artifact, groups, years, index)
+    art_p, art_c = load_artifact(price_artifact), load_artifact(consumption_artifact)
+    noise_p = residual_pool(art_p, _level(df, art_p))
+    noise_c = residual_pool(art_c, _level(df, art_c))
+    fixed_per_year = fixed_cost / max(1, pd.to_numeric(df["year"], errors="coerce").nunique())
+
+    if chunk_size is None:
+        per_group = n_paths * n_years * 8 * 6  # ~6 arrays float64 vivos por grupo
+        chunk_size = int(max(1, max_bytes // max(1, per_group)))
+    rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(n_groups)]
+
+    cols: Dict[str, List[np.ndarray]] = {}
+    kept: Dict[str, List[np.ndarray]] = {"price": [], "consumption": [], "profit": []}
+    for start in range(0, n_groups, chunk_size):
+        sl = slice(start, min(start + chunk_size, n_groups))
+        shape = (n_paths, n_years)
+        shocks_p = np.stack([_draw(rngs[g], noise_p, shape, persistence) for g in range(sl.start, sl.stop)])
+        shocks_c = np.stack([_draw(rngs[g], noise_c, shape, persistence) for g in range(sl.start, sl.stop)])
+        price = _apply(price_hat[sl, None, :], shocks_p, noise_p)
+        cons = _apply(cons_hat[sl, None, :], shocks_c, noise_c)
+        prof = price * cons - fixed_per_year - variable_cost_per_unit * cons
+
+        block = {**_summarize("price", price, quantiles),
+                 **_summarize("consumption", cons, quantiles),
+                 **_summarize("profit", prof, quantiles),
+                 "profit_prob_loss": (prof < 0).mean(axis=1)}
+        for k, v in block.items():
+            cols.setdefault(k, []).append(v)
+        if keep_paths:
+            kept["price"].append(price); kept["consumption"].append(cons); kept["profit"].append(prof)
+
+    summary = pd.DataFrame({
+        "country": np.repeat([g[0] for g in groups], n_years),
+        "type": np.repeat([g[1] for g in groups], n_years),
+        "year": np.tile(years, n_groups),
+        "pred_price": price_hat.ravel(),
+        "pred_consumption": cons_hat.ravel(),
+    })
+    for k, parts in cols.items():
+        summary[k] = np.concatenate(parts).ravel()
+    paths = {k: np.concatenate(v) for k, v in kept.items()} if keep_paths else None
+    return SimulationResult(summary=summary, paths=paths)
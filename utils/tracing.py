@@ -0,0 +1,179 @@
+# utils/tracing.py
+# ------------------------------------------------------------
+# Tracing liviano en proceso (solo stdlib)
+# - span("etapa") / @traced("etapa"): conteo, errores e histograma de latencias por etapa
+# - count("nombre"): contadores libres
+# - Últimas trazas completas (span raíz + sub-etapas) para ver a dónde se fue el tiempo
+# - Export JSON (snapshot) y texto Prometheus (to_prometheus)
+# - Deshabilitado por defecto: el costo es un if + un context manager vacío
+#   Activar con COFFEE_TRACING=1 o enable()
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+# Límites superiores de los buckets (segundos), estilo Prometheus
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+RECENT_TRACES = 50
+
+class _State:
+    enabled = os.getenv("COFFEE_TRACING", "0").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+_local = threading.local()
+_stages: Dict[str, Dict] = {}
+_counters: Dict[str, float] = {}
+_recent: Deque[Dict] = deque(maxlen=RECENT_TRACES)
+
+def enable(flag: bool = True) -> None:
+    _State.enabled = bool(flag)
+
+def is_enabled() -> bool:
+    return _State.enabled
+
+def reset() -> None:
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _recent.clear()
+
+def _record(name: str, seconds: float, error: bool) -> None:
+    with _lock:
+        st = _stages.get(name)
+        if st is None:
+            st = _stages[name] = {"count": 0, "errors": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * len(BUCKETS)}
+        st["count"] += 1
+        st["errors"] += int(error)
+        st["sum"] += seconds
+        st["max"] = max(st["max"], seconds)
+        st["buckets"][bisect_left(BUCKETS, seconds)] += 1
+
+def count(name: str, value: float = 1) -> None:
+    """Suma `value` al contador `name` (no-op si el tracing está apagado)."""
+    if not _State.enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+class _Span:
+    __slots__ = ("name", "t0", "children")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.children: List[tuple] = []
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.t0
+        stack = _local.stack
+        stack.pop()
+        _record(self.name, seconds, exc_type is not None)
+        if stack:
+            stack[-1].children.append((self.name, seconds))
+        else:
+            # Span raíz: se guarda la traza completa (sub-etapas directas)
+            trace = {"name": self.name, "ms": round(seconds * 1000.0, 3), "error": exc_type is not None,
+                     "stages": [{"name": n, "ms": round(s * 1000.0, 3)} for n, s in self.children],
+                     "at": time.time()}
+            with _lock:
+                _recent.append(trace)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP = _NoopSpan()
+
+def span(name: str):
+    """Context manager que mide la etapa `name` (vacío si el tracing está apagado)."""
+    return _Span(name) if _State.enabled else _NOOP
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorador: mide cada llamada como la etapa `name` (por defecto módulo.función)."""
+    def deco(fn: Callable) -> Callable:
+        stage = name or f"{fn.__module__.split('.')[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _State.enabled:
+                return fn(*args, **kwargs)
+            with _Span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def _quantile(buckets: List[int], total: int, q: float) -> float:
+    """Cota superior (ms) del bucket que contiene el cuantil q."""
+    target, acc = q * total, 0
+    for le, n in zip(BUCKETS, buckets):
+        acc += n
+        if acc >= target:
+            return le * 1000.0
+    return float("inf")
+
+def snapshot() -> Dict:
+    """Estado actual serializable a JSON: etapas, contadores y trazas recientes."""
+    with _lock:
+        stages = {k: {**v, "buckets": list(v["buckets"])} for k, v in _stages.items()}
+        counters = dict(_counters)
+        recent = list(_recent)
+    out = {}
+    for name, st in sorted(stages.items()):
+        n = st["count"]
+        out[name] = {
+            "count": n, "errors": st["errors"],
+            "total_ms": round(st["sum"] * 1000.0, 3),
+            "mean_ms": round(st["sum"] * 1000.0 / n, 3) if n else 0.0,
+            "max_ms": round(st["max"] * 1000.0, 3),
+            "p50_le_ms": _quantile(st["buckets"], n, 0.5),
+            "p90_le_ms": _quantile(st["buckets"], n, 0.9),
+            "p99_le_ms": _quantile(st["buckets"], n, 0.99),
+            "buckets": dict(zip([str(b) for b in BUCKETS], st["buckets"])),
+        }
+    return {"enabled": _State.enabled, "stages": out, "counters": counters, "recent": recent}
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def to_prometheus(prefix: str = "coffee") -> str:
+    """Histogramas y contadores en formato de texto de Prometheus."""
+    with _lock:
+        stages = {k: {**v, "buckets": list(v["buckets"])} for k, v in _stages.items()}
+        counters = dict(_counters)
+    lines = [f"# HELP {prefix}_stage_seconds Latencia por etapa del pipeline",
+             f"# TYPE {prefix}_stage_seconds histogram"]
+    for name, st in sorted(stages.items()):
+        lab = _label(name)
+        acc = 0
+        for le, n in zip(BUCKETS, st["buckets"]):
+            acc += n
+            le_txt = "+Inf" if le == float("inf") else repr(le)
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{lab}",le="{le_txt}"}} {acc}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{lab}"}} {st["sum"]!r}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{lab}"}} {st["count"]}')
+    lines += [f"# HELP {prefix}_stage_errors_total Llamadas que terminaron en excepción",
+              f"# TYPE {prefix}_stage_errors_total counter"]
+    lines += [f'{prefix}_stage_errors_total{{stage="{_label(k)}"}} {v["errors"]}' for k, v in sorted(stages.items())]
+    lines += [f"# HELP {prefix}_events_total Contadores del pipeline",
+              f"# TYPE {prefix}_events_total counter"]
+    lines += [f'{prefix}_events_total{{name="{_label(k)}"}} {v}' for k, v in sorted(counters.items())]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,312 @@
+# utils/train.py
+# ------------------------------------------------------------
+# Motor de entrenamiento/CV en paralelo (reemplaza el loop del notebook)
+# - Tareas (target × modelo × fold) en un pool de procesos
+# - X/y de cada target se comparten como .npy memory-mapped (sin pickle)
+# - Escribe results/cv_metrics_by_fold.csv, results/cv_summary_by_model.csv
+#   y models/{target}_model.joblib (artifact "rico" compatible con la app)
+# Ejecuta: python -m utils.train --workers 4
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import argparse
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import dump
+
+from utils.features import GROUP_COLS, build_xy, feature_names, log1p_nonneg, make_codebook
+from utils.io import load_clean_dataset
+from utils.metrics import mase_scale, regression_report_batch
+
+TARGETS = ("consumption", "price", "profit")
+MODELS = ("ridge", "lasso", "rf")
+POSITIVE_TARGETS = ("price", "consumption")
+RANDOM_STATE = 42
+LINEAR_MODELS = ("ridge", "lasso")
+LAG_FEATURE = re.compile(r"_(lag|ma)\d+$")
+
+# -----------------------
+# Modelos
+# -----------------------
+
+def linear_features(feat_cols: Sequence[str], log_lags: bool):
+    """
+    Preprocesado de los modelos lineales sobre las columnas de build_xy (por posición):
+    códigos de country/type one-hot (no ordinales) y, si el target se entrena en log1p,
+    rezagos y medias móviles en la misma escala log1p.
+    """
+    from sklearn.compose import ColumnTransformer
+    from sklearn.preprocessing import FunctionTransformer, OneHotEncoder
+
+    codes = [j for j, c in enumerate(feat_cols) if c.endswith("_code")]
+    lagged = [j for j, c in enumerate(feat_cols) if LAG_FEATURE.search(c)]
+    steps = [("onehot", OneHotEncoder(handle_unknown="ignore", sparse_output=False), codes)]
+    if log_lags and lagged:
+        steps.append(("log1p", FunctionTransformer(log1p_nonneg), lagged))
+    return ColumnTransformer(steps, remainder="passthrough", sparse_threshold=0.0)
+
+def make_model(name: str, target: str, rf_jobs: int = 1, n_estimators: int = 300,
+               feat_cols: Sequence[str] | None = None):
+    """
+    Mismos candidatos que Inferencia_patched.ipynb (log1p/expm1 para targets no negativos).
+    El imputador por mediana reemplaza el fillna del notebook y viaja con el artifact,
+    así la app puede predecir filas con rezagos faltantes.
+    Ridge/Lasso agregan linear_features (columnas de build_xy; por defecto feature_names(target)).
+    """
+    from sklearn.compose import TransformedTargetRegressor
+    from sklearn.impute import SimpleImputer
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.linear_model import Lasso, Ridge
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    if name in LINEAR_MODELS:
+        feats = linear_features(feat_cols or feature_names(target), target in POSITIVE_TARGETS)
+        est = (Ridge(alpha=1.0, random_state=RANDOM_STATE) if name == "ridge"
+               else Lasso(alpha=0.01, random_state=RANDOM_STATE, max_iter=10000))
+        # keep_empty_features: las posiciones de linear_features no se corren si una columna viene vacía
+        pipe = Pipeline([("impute", SimpleImputer(strategy="median", keep_empty_features=True)), ("features", feats),
+                         ("scaler", StandardScaler(with_mean=False)), ("model", est)])
+    elif name == "rf":
+        pipe = Pipeline([("impute", SimpleImputer(strategy="median")), ("model", RandomForestRegressor(n_estimators=n_estimators, random_state=RANDOM_STATE, n_jobs=rf_jobs))])
+    else:
+        raise ValueError(f"Modelo desconocido: {name}")
+    if target in POSITIVE_TARGETS:
+        return TransformedTargetRegressor(regressor=pipe, func=np.log1p, inverse_func=np.expm1)
+    return pipe
+
+def fit_rows(name: str, target: str, X: np.ndarray, feat_cols: Sequence[str] | None = None) -> np.ndarray:
+    """
+    Filas con las que se ajusta `name`. Los lineales saltan las filas sin primer rezago
+    (primer año de cada grupo): con el rezago imputado por la mediana, su nivel solo lo
+    explicaría el one-hot del grupo y ese residuo (enorme en log1p) domina el ajuste.
+    """
+    keep = np.ones(len(X), dtype=bool)
+    if name in LINEAR_MODELS:
+        lag1 = list(feat_cols or feature_names(target)).index(f"{target}_lag1")
+        has_lag = ~np.isnan(X[:, lag1])
+        if has_lag.any():
+            keep = has_lag
+    return keep
+
+FOLD_METRICS = ["RMSE", "MAE", "sMAPE(%)", "MdAPE(%)", "MASE"]
+
+def score_folds(scored: Sequence[Tuple]) -> pd.DataFrame:
+    """
+    Métricas de todos los (target, modelo, fold) en una sola llamada vectorizada.
+    `scored`: tuplas (target, model, fold, y_val, pred, escala_MASE).
+    """
+    width = max(len(s[3]) for s in scored)
+    y_true = np.full((len(scored), width), np.nan)
+    y_pred = np.full((len(scored), width), np.nan)
+    for i, (_, _, _, yt, yp, _) in enumerate(scored):
+        y_true[i, :len(yt)] = yt
+        y_pred[i, :len(yp)] = yp
+    labels = pd.DataFrame([s[:3] for s in scored], columns=["target", "model", "fold"])
+    out = regression_report_batch(y_true, y_pred, scale=[s[5] for s in scored], labels=labels)
+    return out[["target", "model", "fold", *FOLD_METRICS]]
+
+# -----------------------
+# Folds y datos compartidos
+# -----------------------
+
+def year_based_cv(years: np.ndarray, initial_train_years: int = 21, val_years: int = 3,
+                  step: int = 1) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Ventana expansiva por años (como Inferencia.ipynb); devuelve posiciones train/val."""
+    uniq = np.unique(years[~np.isnan(years)]).astype(int)
+    if len(uniq) < initial_train_years + val_years:
+        initial_train_years = max(3, len(uniq) - val_years - 1)
+    for start in range(0, max(1, len(uniq) - initial_train_years - val_years + 1), step):
+        tr_years = uniq[:initial_train_years + start]
+        va_years = uniq[initial_train_years + start: initial_train_years + start + val_years]
+        yield np.flatnonzero(np.isin(years, tr_years)), np.flatnonzero(np.isin(years, va_years))
+
+def prepare_target(df: pd.DataFrame, target: str, codebook) -> Tuple[np.ndarray, np.ndarray, List[str], np.ndarray]:
+    """
+    Matriz de features densa (float64) y target, solo filas con target.
+    Los NaN de X (primeros años de cada grupo) los imputa el modelo.
+    Devuelve X, y, feat_cols y las posiciones de df que quedaron.
+    """
+    X, y, feat_cols = build_xy(df, target, codebook=codebook)
+    Xv = X.to_numpy(dtype=float)
+    yv = pd.to_numeric(y, errors="coerce").to_numpy(dtype=float)
+    keep = ~np.isnan(yv)
+    yv = yv[keep]
+    if target in POSITIVE_TARGETS:
+        yv = np.clip(yv, 0, None)
+    return np.ascontiguousarray(Xv[keep]), yv, feat_cols, np.flatnonzero(keep)
+
+def load_training_frame(data_path: str | Path) -> Tuple[pd.DataFrame, Dict]:
+    """Dataset limpio ordenado por (country, type, year) y su codebook."""
+    df = load_clean_dataset(data_path)
+    df["year"] = pd.to_numeric(df["year"], errors="coerce")
+    for c in GROUP_COLS:
+        df[c] = df[c].astype(str)
+    df = df.sort_values(["country", "type", "year"]).reset_index(drop=True)
+    return df, make_codebook(df)
+
+_SHARED: Dict[str, np.ndarray] = {}
+
+def _init_worker(paths: Dict[str, str]) -> None:
+    """Abre los .npy en modo mmap una vez por proceso."""
+    for name, path in paths.items():
+        _SHARED[name] = np.load(path, mmap_mode="r")
+
+def _fit_fold(task) -> np.ndarray:
+    """Predicciones de validación; las métricas se calculan juntas en el proceso padre."""
+    target, model_name, fold, tr, va, rf_jobs, n_estimators = task
+    X, y = _SHARED[f"X_{target}"], _SHARED[f"y_{target}"]
+    mdl = make_model(model_name, target, rf_jobs, n_estimators)
+    tr = tr[fit_rows(model_name, target, X[tr])]
+    mdl.fit(X[tr], y[tr])
+    return mdl.predict(X[va])
+
+def _fit_final(task) -> Tuple[str, str]:
+    """Calibra PI con el último fold, reentrena con todo y guarda el artifact."""
+    target, model_name, tr, va, rf_jobs, n_estimators, meta, out_path = task
+    X, y = _SHARED[f"X_{target}"], _SHARED[f"y_{target}"]
+    mdl = make_model(model_name, target, rf_jobs, n_estimators)
+    tr = tr[fit_rows(model_name, target, X[tr])]
+    mdl.fit(X[tr], y[tr])
+    y_va, pred = np.asarray(y[va], dtype=float), mdl.predict(X[va])
+    resid = y_va - pred
+    q80 = float(np.quantile(np.abs(resid), 0.80)) if len(resid) else 0.0
+    q95 = float(np.quantile(np.abs(resid), 0.95)) if len(resid) else 0.0
+    extra = {}
+    if target in POSITIVE_TARGETS:
+        # Residuales en el espacio del modelo (log1p): utils.simulate los escala por grupo
+        extra["resid_val_log"] = np.log1p(np.clip(y_va, 0, None)) - np.log1p(np.clip(pred, 0, None))
+    keep = fit_rows(model_name, target, X)
+    mdl.fit(X[keep], y[keep])
+    dump({"model": mdl, "y_col": target, "PI80_abs": q80, "PI95_abs": q95,
+          "resid_val": resid.astype(float), **extra, "model_name": model_name, **meta}, out_path)
+    return target, out_path
+
+# -----------------------
+# Baselines y resumen
+# -----------------------
+
+def naive_baseline(df: pd.DataFrame, target: str, tr: np.ndarray, va: np.ndarray) -> np.ndarray:
+    """Último valor de entrenamiento del grupo (o el promedio de entrenamiento)."""
+    train = df.iloc[tr].sort_values("year", kind="stable")
+    last = train.groupby(GROUP_COLS, observed=True)[target].last()
+    val_keys = pd.MultiIndex.from_frame(df.iloc[va][GROUP_COLS])
+    pred = last.reindex(val_keys).to_numpy(dtype=float)
+    return np.where(np.isnan(pred), train[target].mean(), pred)
+
+def summarize_results(df: pd.DataFrame) -> pd.DataFrame:
+    agg = df.groupby(["logical_target", "model"]).agg(
+        RMSE_mean=("RMSE", "mean"), MAE_mean=("MAE", "mean"),
+        sMAPE_mean=("sMAPE(%)", "mean"), MdAPE_mean=("MdAPE(%)", "mean"),
+        MASE_mean=("MASE", "mean"), folds=("fold", "nunique")
+    ).reset_index()
+    agg["rank_sMAPE"] = agg.groupby("logical_target")["sMAPE_mean"].rank(method="first")
+    return agg.sort_values(["logical_target", "rank_sMAPE"])
+
+# -----------------------
+# Orquestación
+# -----------------------
+
+def run(data_path: str | Path, targets: Sequence[str] = TARGETS, models: Sequence[str] = MODELS,
+        workers: int | None = None, rf_jobs: int = 1, n_estimators: int = 300,
+        initial_train_years: int = 21, val_years: int = 3,
+        models_dir: str | Path = "models", results_dir: str | Path = "results") -> Dict[str, pd.DataFrame]:
+    """CV + modelos finales. Devuelve {'folds': ..., 'summary': ...}."""
+    df, codebook = load_training_frame(data_path)
+    targets = [t for t in targets if t in df.columns]
+    workers = max(1, workers or os.cpu_count() or 1)
+
+    models_dir, results_dir = Path(models_dir), Path(results_dir)
+    models_dir.mkdir(parents=True, exist_ok=True)
+    results_dir.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(prefix="coffee_train_") as tmp:
+        paths: Dict[str, str] = {}
+        info = {}
+        for t in targets:
+            X, y, feat_cols, rows = prepare_target(df, t, codebook)
+            for name, arr in ((f"X_{t}", X), (f"y_{t}", y)):
+                paths[name] = os.path.join(tmp, f"{name}.npy")
+                np.save(paths[name], arr)
+            years = df["year"].to_numpy(dtype=float)[rows]
+            folds = list(year_based_cv(years, initial_train_years, val_years))
+            info[t] = (feat_cols, rows, folds)
+
+        fold_tasks, scored, scales, y_by = [], [], {}, {}
+        for t in targets:
+            feat_cols, rows, folds = info[t]
+            y_all = y_by[t] = np.load(paths[f"y_{t}"], mmap_mode="r")
+            for fold, (tr, va) in enumerate(folds, start=1):
+                scales[t, fold] = float(mase_scale(y_all[tr])[0])
+                base = naive_baseline(df, t, rows[tr], rows[va])
+                scored += [(t, "naive", fold, y_all[va], base, scales[t, fold]),
+                           (t, "snaive", fold, y_all[va], base, scales[t, fold])]
+                fold_tasks += [(t, name, fold, tr, va, rf_jobs, n_estimators) for name in models]
+
+        if workers == 1:
+            _init_worker(paths)
+            preds = [_fit_fold(task) for task in fold_tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(paths,)) as pool:
+                preds = list(pool.map(_fit_fold, fold_tasks))
+        for (t, name, fold, _, va, _, _), pred in zip(fold_tasks, preds):
+            scored.append((t, name, fold, y_by[t][va], pred, scales[t, fold]))
+
+        order = {n: i for i, n in enumerate(["naive", "snaive", *models])}
+        results = score_folds(scored)
+        results["logical_target"] = results["target"]
+        results = (results.assign(_t=results["target"].map({t: i for i, t in enumerate(targets)}),
+                                  _m=results["model"].map(order))
+                          .sort_values(["_t", "fold", "_m"]).drop(columns=["_t", "_m"])
+                          .reset_index(drop=True))
+        summary = summarize_results(results)
+
+        best = (summary.loc[~summary["model"].isin(["naive", "snaive"])]
+                       .sort_values(["logical_target", "sMAPE_mean"])
+                       .groupby("logical_target").first()["model"])
+        final_tasks = []
+        for t in targets:
+            feat_cols, rows, folds = info[t]
+            tr, va = folds[-1]
+            meta = {"feat_cols": feat_cols, "group_cols": list(GROUP_COLS), "codebook": codebook}
+            final_tasks.append((t, best[t], tr, va, rf_jobs, n_estimators, meta,
+                                str(models_dir / f"{t}_model.joblib")))
+        if workers == 1:
+            saved = [_fit_final(task) for task in final_tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(final_tasks)),
+                                     initializer=_init_worker, initargs=(paths,)) as pool:
+                saved = list(pool.map(_fit_final, final_tasks))
+
+    results.to_csv(results_dir / "cv_metrics_by_fold.csv", index=False)
+    summary.to_csv(results_dir / "cv_summary_by_model.csv", index=False)
+    for t, path in saved:
+        print(f"✅ {t}: {best[t]} -> {path}")
+    return {"folds": results, "summary": summary}
+
+def main(argv: Sequence[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Entrenamiento y CV en paralelo de los modelos de Coffee")
+    ap.add_argument("--data", default=os.getenv("DATA_CLEAN", "data/coffee_clean.csv"))
+    ap.add_argument("--targets", nargs="+", default=list(TARGETS))
+    ap.add_argument("--models", nargs="+", default=list(MODELS))
+    ap.add_argument("--workers", type=int, default=None, help="procesos (por defecto: todos los núcleos)")
+    ap.add_argument("--rf-jobs", type=int, default=1, help="n_jobs de cada RandomForest")
+    ap.add_argument("--n-estimators", type=int, default=300)
+    ap.add_argument("--initial-train-years", type=int, default=21)
+    ap.add_argument("--val-years", type=int, default=3)
+    ap.add_argument("--models-dir", default="models")
+    ap.add_argument("--results-dir", default="results")
+    args = ap.parse_args(argv)
+    out = run(args.data, args.targets, args.models, args.workers, args.rf_jobs, args.n_estimators,
+              args.initial_train_years, args.val_years, args.models_dir, args.results_dir)
+    print(out["summary"].to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# utils/trees.py
+# ------------------------------------------------------------
+# Formato plano para modelos de árboles (RandomForest/ExtraTrees/DecisionTree)
+# - Exporta todos los nodos a arrays NumPy (feature, threshold, left, right, value)
+#   guardados como .npy sin comprimir → np.load(mmap_mode="r") casi instantáneo y
+#   páginas compartidas entre procesos (mismo archivo en la caché del SO)
+# - Predictor vectorizado: recorre todos los árboles para todo el batch a la vez
+# - Soporta TransformedTargetRegressor(log1p/expm1) y Pipeline con SimpleImputer
+# Ejecuta: python -m utils.trees models/price_model.joblib [--check data/coffee_clean.csv]
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import argparse
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+ARRAYS = ("feature", "threshold", "left", "right", "value", "missing_left", "roots")
+INVERSE_FUNCS = {"expm1": np.expm1}
+FORMAT_VERSION = 1
+
+def _unwrap(model) -> Tuple[object, Optional[np.ndarray], Optional[str]]:
+    """(ensamble de árboles, medianas del imputador o None, nombre de la inversa del target o None)."""
+    from sklearn.compose import TransformedTargetRegressor
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+
+    inverse = None
+    if isinstance(model, TransformedTargetRegressor):
+        if model.transformer is not None or model.inverse_func is not np.expm1:
+            raise ValueError("Solo se soporta TransformedTargetRegressor con inverse_func=np.expm1")
+        inverse = "expm1"
+        model = model.regressor_
+    fill = None
+    if isinstance(model, Pipeline):
+        for name, step in model.steps[:-1]:
+            if isinstance(step, SimpleImputer) and step.strategy in ("median", "mean", "constant", "most_frequent") \
+                    and not getattr(step, "add_indicator", False):
+                fill = np.asarray(step.statistics_, dtype=float)
+                if not getattr(step, "keep_empty_features", False) and np.isnan(fill).any():
+                    raise ValueError("SimpleImputer descarta columnas vacías: formato plano no soportado")
+            elif step is not None and step != "passthrough":
+                raise ValueError(f"Paso de Pipeline no soportado en formato plano: {name} ({type(step).__name__})")
+        model = model.steps[-1][1]
+    trees = getattr(model, "estimators_", None)
+    if trees is None and hasattr(model, "tree_"):
+        trees = [model]
+    if trees is None or not all(hasattr(t, "tree_") for t in np.ravel(trees)):
+        raise ValueError(f"Modelo no soportado en formato plano: {type(model).__name__}")
+    return model, fill, inverse
+
+def flatten_trees(model) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """Arrays planos (índices de hijos globales; -1 en hojas) y metadata."""
+    ens, fill, inverse = _unwrap(model)
+    trees = [t.tree_ for t in np.ravel(getattr(ens, "estimators_", [ens]))]
+    sizes = np.array([t.node_count for t in trees], dtype=np.int64)
+    offsets = np.r_[0, np.cumsum(sizes)[:-1]]
+
+    def cat(fn, dtype):
+        return np.concatenate([fn(t).astype(dtype, copy=False) for t in trees])
+
+    left = cat(lambda t: t.children_left, np.int64)
+    right = cat(lambda t: t.children_right, np.int64)
+    node_off = np.repeat(offsets, sizes)
+    leaf = left == -1
+    arrays = {
+        "feature": cat(lambda t: t.feature, np.int32),
+        "threshold": cat(lambda t: t.threshold, np.float64),
+        "left": np.where(leaf, -1, left + node_off).astype(np.int32),
+        "right": np.where(leaf, -1, right + node_off).astype(np.int32),
+        "value": cat(lambda t: t.value[:, 0, 0], np.float64),
+        "missing_left": cat(lambda t: getattr(t, "missing_go_to_left", np.zeros(t.node_count, np.uint8)), np.uint8),
+        "roots": offsets.astype(np.int32),
+    }
+    meta = {
+        "format": FORMAT_VERSION,
+        "n_trees": len(trees),
+        "n_nodes": int(sizes.sum()),
+        "max_depth": int(max(t.max_depth for t in trees)),
+        "n_features": int(getattr(ens, "n_features_in_", trees[0].n_features)),
+        "feature_names": [str(c) for c in getattr(ens, "feature_names_in_", [])] or None,
+        "inverse": inverse,
+        "fill": fill.tolist() if fill is not None else None,
+    }
+    return arrays, meta
+
+class FlatForest:
+    """
+    Bosque plano con predict vectorizado (mismo resultado que sklearn).
+    Al serializarse (joblib) solo guarda la ruta absoluta de la carpeta: los arrays se vuelven
+    a abrir con mmap, sin depender del directorio de trabajo de quien carga el artifact.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict, path: Optional[str] = None):
+        self.arrays = arrays
+        self.meta = meta
+        self.path = path
+        names = meta.get("feature_names")
+        if names:
+            self.feature_names_in_ = np.asarray(names, dtype=object)
+        self.n_features_in_ = meta["n_features"]
+
+    @classmethod
+    def from_model(cls, model) -> "FlatForest":
+        arrays, meta = flatten_trees(model)
+        return cls(arrays, meta)
+
+    def save(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(path / f"{name}.npy", np.ascontiguousarray(self.arrays[name]))
+        (path / "meta.json").write_text(json.dumps(self.meta, indent=2), encoding="utf-8")
+        self.path = str(path.resolve())
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path, mmap: bool = True) -> "FlatForest":
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None) for name in ARRAYS}
+        return cls(arrays, meta, str(path.resolve()))
+
+    def __getstate__(self):
+        if self.path is None:
+            raise ValueError("Guarda el bosque (save) antes de serializarlo")
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        other = FlatForest.load(state["path"])
+        self.__dict__.update(other.__dict__)
+
+    def _as_matrix(self, X) -> np.ndarray:
+        names = self.meta.get("feature_names")
+        if hasattr(X, "columns") and names:
+            X = X.reindex(columns=names)
+        if hasattr(X, "toarray"):
+            X = X.toarray()
+        # sklearn compara en float32 contra umbrales float64
+        X = np.asarray(X, dtype=np.float32)
+        fill = self.meta.get("fill")
+        if fill is not None:
+            X = np.where(np.isnan(X), np.asarray(fill, dtype=np.float32), X)
+        return X
+
+    def predict(self, X, batch_size: int = 4096) -> np.ndarray:
+        X = self._as_matrix(X)
+        a = self.arrays
+        feature, threshold = a["feature"], a["threshold"]
+        left, right, missing_left = a["left"], a["right"], a["missing_left"]
+        roots, value = np.asarray(a["roots"]), a["value"]
+        out = np.empty(len(X), dtype=float)
+        for start in range(0, len(X), batch_size):
+            Xb = X[start:start + batch_size]
+            rows = np.arange(len(Xb))[None, :]
+            node = np.repeat(roots[:, None], len(Xb), axis=1)  # (árboles, filas)
+            for _ in range(self.meta["max_depth"]):
+                lft = left[node]
+                active = lft != -1
+                if not active.any():
+                    break
+                x = Xb[rows, feature[node]]
+                go_left = np.where(np.isnan(x), missing_left[node] == 1, x <= threshold[node])
+                node = np.where(active, np.where(go_left, lft, right[node]), node)
+            out[start:start + len(Xb)] = value[node].mean(axis=0)
+        inverse = self.meta.get("inverse")
+        return INVERSE_FUNCS[inverse](out) if inverse else out
+
+def export_artifact(artifact_path: str | Path, out_dir: str | Path | None = None) -> Path:
+    """
+    Escribe <artifact>.flat/ (arrays + meta.json) y <artifact>.flat.joblib:
+    el mismo dict del artifact con 'model' = FlatForest (carga casi instantánea).
+    """
+    from joblib import dump, load
+    artifact_path = Path(artifact_path)
+    art = load(artifact_path)
+    model = art["model"] if isinstance(art, dict) else art
+    base = artifact_path.with_suffix("")
+    out_dir = Path(out_dir) if out_dir else base.parent / f"{base.name}.flat"
+    flat = FlatForest.from_model(model)
+    if isinstance(art, dict) and art.get("feat_cols") and not flat.meta.get("feature_names"):
+        # Modelos ajustados con arrays: el orden de columnas lo da feat_cols
+        flat.meta["feature_names"] = [str(c) for c in art["feat_cols"]]
+    flat.save(out_dir)
+    flat = FlatForest.load(out_dir)
+    new_art = {**art, "model": flat} if isinstance(art, dict) else {"model": flat}
+    out_path = out_dir.parent / f"{out_dir.name}.joblib"
+    dump(new_art, out_path, compress=0)
+    return out_path
+
+def max_abs_diff(model, flat: FlatForest, X) -> float:
+    """Diferencia máxima entre sklearn y el formato plano (para validar la exportación)."""
+    import warnings
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        warnings.filterwarnings("ignore", message="X has feature names")
+        ref = np.asarray(model.predict(X), dtype=float)
+    return float(np.max(np.abs(ref - flat.predict(X)))) if len(ref) else 0.0
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Exporta un artifact de árboles a formato plano (NumPy + mmap)")
+    ap.add_argument("artifact")
+    ap.add_argument("--out", default=None, help="carpeta de salida (por defecto <artifact>.flat)")
+    ap.add_argument("--check", default=None, help="dataset para comparar predicciones con sklearn")
+    args = ap.parse_args(argv)
+
+    # Con `python -m utils.trees` este módulo es __main__: se importa por su nombre para que
+    # el artifact serialice utils.trees.FlatForest y no __main__.FlatForest
+    from utils.trees import export_artifact, max_abs_diff
+    out = export_artifact(args.artifact, args.out)
+    print(f"✅ Artifact plano: {out}")
+    if args.check:
+        from utils.cache import load_artifact
+        from utils.inference import _build_feature_matrix, load_artifact_info, load_context
+        mdl, y_col, feat_cols, _, _, _, art = load_artifact_info(args.artifact)
+        df, _ = load_context(args.check)
+        X = _build_feature_matrix(df, mdl, y_col, feat_cols, encoder=art.get("encoder"))
+        flat = load_artifact(str(out))["model"]
+        print(f"max |sklearn - plano| = {max_abs_diff(mdl, flat, X):.3e} sobre {X.shape[0]} filas")
+
+if __name__ == "__main__":
+    main()